@@ -0,0 +1,32 @@
+import os
+
+from django.core.asgi import get_asgi_application
+from django.core.handlers.asgi import ASGIHandler
+from django.urls import reverse
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+
+django_application = get_asgi_application()
+
+
+class StreamHandler(ASGIHandler):
+    """ASGIHandler without a thread per request, for long-lived streams.
+
+    ASGIHandler runs each request's sync middleware on a thread of its own
+    that lives until the response ends; for an open stream that is a thread
+    per client. Here the sync parts share one thread, they only run while a
+    stream starts.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.handle(scope, receive, send)
+
+
+stream_application = StreamHandler()
+STREAM_PATHS = {reverse('quiz:leaderboard_stream')}
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] in STREAM_PATHS:
+        return await stream_application(scope, receive, send)
+    return await django_application(scope, receive, send)
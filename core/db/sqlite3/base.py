@@ -0,0 +1,14 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite backend that applies the PRAGMAS setting to every new connection.
+
+    e.g. 'PRAGMAS': {'journal_mode': 'wal', 'synchronous': 'normal'}
+    """
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for pragma, value in self.settings_dict.get('PRAGMAS', {}).items():
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        return conn
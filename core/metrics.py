@@ -0,0 +1,104 @@
+import threading
+from bisect import bisect_left
+from collections import defaultdict, deque
+
+# Upper bounds in milliseconds (or queries, for the query count histogram)
+BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class RollingHistogram:
+    """Keeps the last `window` samples and summarizes them on demand."""
+
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+
+    def observe(self, value):
+        self.samples.append(value)
+
+    def summary(self):
+        samples = sorted(self.samples)
+        if not samples:
+            return {'count': 0}
+        buckets = [0] * (len(BUCKETS) + 1)
+        for value in samples:
+            buckets[bisect_left(BUCKETS, value)] += 1
+
+        def pct(p):
+            return round(samples[min(len(samples) - 1, int(len(samples) * p / 100))], 3)
+
+        return {
+            'count': len(samples),
+            'mean': round(sum(samples) / len(samples), 3),
+            'p50': pct(50),
+            'p95': pct(95),
+            'p99': pct(99),
+            'max': round(samples[-1], 3),
+            'buckets': {
+                **{f"le_{bound}": count for bound, count in zip(BUCKETS, buckets)},
+                'inf': buckets[-1],
+            },
+        }
+
+
+class MetricsRegistry:
+    METRICS = ('queries', 'db_ms', 'render_ms', 'total_ms')
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.lock = threading.Lock()
+        self.views = defaultdict(self._new_view)
+        self.queries = defaultdict(int)  # (database alias, 'read' or 'write') -> count
+
+    def _new_view(self):
+        return {
+            'requests': 0,
+            'over_budget': 0,
+            **{metric: RollingHistogram(self.window) for metric in self.METRICS},
+        }
+
+    def observe(self, view, over_budget=False, **values):
+        with self.lock:
+            stats = self.views[view]
+            stats['requests'] += 1
+            stats['over_budget'] += int(over_budget)
+            for metric, value in values.items():
+                stats[metric].observe(value)
+
+    def count_queries(self, counts):
+        with self.lock:
+            for key, count in counts.items():
+                self.queries[key] += count
+
+    def database_snapshot(self):
+        with self.lock:
+            queries = dict(self.queries)
+        reads = sum(count for (_, kind), count in queries.items() if kind == 'read')
+        replica_reads = sum(
+            count for (alias, kind), count in queries.items()
+            if kind == 'read' and alias != 'default'
+        )
+        writes = sum(count for (_, kind), count in queries.items() if kind == 'write')
+        return {
+            'queries': {f"{alias}.{kind}": count for (alias, kind), count in sorted(queries.items())},
+            'read_ratio': round(reads / (reads + writes), 3) if reads + writes else None,
+            'replica_read_ratio': round(replica_reads / reads, 3) if reads else None,
+        }
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                view: {
+                    'requests': stats['requests'],
+                    'over_budget': stats['over_budget'],
+                    **{metric: stats[metric].summary() for metric in self.METRICS},
+                }
+                for view, stats in sorted(self.views.items())
+            }
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+            self.queries.clear()
+
+
+registry = MetricsRegistry()
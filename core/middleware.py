@@ -0,0 +1,111 @@
+import logging
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from core import routers
+from core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.by_database = defaultdict(int)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+            kind = 'read' if sql.lstrip()[:6].upper() == 'SELECT' else 'write'
+            self.by_database[context['connection'].alias, kind] += 1
+
+
+class RequestMetricsMiddleware:
+    """Records query count, DB time, template render time and latency per view."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.query_budget = getattr(settings, 'METRICS_QUERY_BUDGET', None)
+        registry.window = getattr(settings, 'METRICS_WINDOW', registry.window)
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        request._render_seconds = 0.0
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        over_budget = self.query_budget is not None and recorder.count > self.query_budget
+        if over_budget:
+            logger.warning(
+                f"{request.method} {request.path} ({view}) ran {recorder.count} queries,"
+                f" over the budget of {self.query_budget}"
+            )
+            response['X-Query-Budget-Exceeded'] = str(recorder.count)
+
+        registry.observe(
+            view, over_budget=over_budget,
+            queries=recorder.count,
+            db_ms=recorder.seconds * 1000,
+            render_ms=request._render_seconds * 1000,
+            total_ms=total * 1000,
+        )
+        registry.count_queries(recorder.by_database)
+        return response
+
+    def process_template_response(self, request, response):
+        # Rendering starts right after this hook returns and ends with the callbacks
+        started = time.perf_counter()
+
+        def rendered(response):
+            request._render_seconds = time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """Lets read-only views read from the replicas, see core.routers.
+
+    A view opts in with use_replica = True; admin changelists always do.
+    After a request writes, the user is pinned to the primary for
+    REPLICA_PIN_SECONDS so they see their own changes despite replica lag.
+    """
+    PIN_COOKIE = 'primary_pin'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+    def __call__(self, request):
+        tokens = routers.start_request()
+        try:
+            response = self.get_response(request)
+            if routers.wrote():
+                response.set_cookie(
+                    self.PIN_COOKIE, '1', max_age=self.pin_seconds, httponly=True, samesite='Lax'
+                )
+            return response
+        finally:
+            routers.end_request(tokens)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD') or self.PIN_COOKIE in request.COOKIES:
+            return None
+        match = request.resolver_match
+        admin_changelist = match.namespace == 'admin' and (match.url_name or '').endswith('_changelist')
+        if admin_changelist or getattr(getattr(view_func, 'view_class', None), 'use_replica', False):
+            routers.read_from_replicas()
+        return None
@@ -0,0 +1,51 @@
+import contextvars
+import random
+from django.conf import settings
+
+# Sessions and users are read on every request; a lagging replica would log people out
+PRIMARY_APPS = {'auth', 'contenttypes', 'sessions'}
+
+_reads_from_replica = contextvars.ContextVar('reads_from_replica', default=False)
+_wrote = contextvars.ContextVar('wrote', default=False)
+
+
+def start_request():
+    return _reads_from_replica.set(False), _wrote.set(False)
+
+
+def end_request(tokens):
+    replica_token, wrote_token = tokens
+    _reads_from_replica.reset(replica_token)
+    _wrote.reset(wrote_token)
+
+
+def read_from_replicas():
+    _reads_from_replica.set(True)
+
+
+def wrote():
+    return _wrote.get()
+
+
+class ReplicaRouter:
+    """Writes go to the primary. Reads go to a random replica, but only inside
+    requests core.middleware.ReplicaRoutingMiddleware marked read-only, and
+    only until that request writes something itself."""
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', ())
+        if (replicas and _reads_from_replica.get() and not _wrote.get()
+                and model._meta.app_label not in PRIMARY_APPS):
+            return random.choice(replicas)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in getattr(settings, 'DATABASE_REPLICAS', ())
@@ -42,17 +42,26 @@ CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
 
+# Per-view request metrics, served as JSON at /metrics/ to staff, or to scrapers
+# sending "Authorization: Bearer $QUIZ_METRICS_TOKEN" when a token is set.
+# Requests running more queries than the budget are logged and flagged
+METRICS_TOKEN = os.environ.get('QUIZ_METRICS_TOKEN', '')
+METRICS_QUERY_BUDGET = 30
+METRICS_WINDOW = 1000  # Samples kept per view and metric
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -70,17 +79,117 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'core.wsgi.application'
+# The live leaderboard (leaderboard/stream/) holds its connections open,
+# serve it with an ASGI server, e.g. uvicorn core.asgi:application
+ASGI_APPLICATION = 'core.asgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.0.6/ref/settings/#databases
+#
+# QUIZ_DB_ENGINE=sqlite (default) keeps SQLite's rollback journal unless
+# QUIZ_SQLITE_WAL=1, which switches the database file to WAL mode so answer
+# writes don't block readers (the mode sticks to the file, next to its -wal and
+# -shm files); QUIZ_DB_ENGINE=postgresql (needs psycopg installed) keeps
+# persistent, health-checked connections.
+
+DB_ENGINE = os.environ.get('QUIZ_DB_ENGINE', 'sqlite')
+SQLITE_WAL = os.environ.get('QUIZ_SQLITE_WAL', '') == '1'
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('QUIZ_DB_NAME', 'quiz'),
+            'USER': os.environ.get('QUIZ_DB_USER', 'quiz'),
+            'PASSWORD': os.environ.get('QUIZ_DB_PASSWORD', ''),
+            'HOST': os.environ.get('QUIZ_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('QUIZ_DB_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('QUIZ_DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'core.db.sqlite3',
+            'NAME': os.environ.get('QUIZ_DB_NAME', BASE_DIR + "/db.sqlite3"),
+            'CONN_MAX_AGE': int(os.environ.get('QUIZ_DB_CONN_MAX_AGE', 0)),
+            'OPTIONS': {
+                'timeout': 20,
+            },
+            # Run on every new connection by core.db.sqlite3
+            'PRAGMAS': {
+                'busy_timeout': 20000,
+                'temp_store': 'memory',
+            },
+        }
+    }
+    if SQLITE_WAL:
+        # synchronous=normal is only crash safe with WAL
+        DATABASES['default']['PRAGMAS'].update(journal_mode='wal', synchronous='normal')
+
+# Read replicas: QUIZ_DB_REPLICAS is a comma separated list of replica hosts
+# for PostgreSQL, or of database files for SQLite (kept in sync from the
+# primary, e.g. by Litestream, or a plain copy for local testing). Read-only
+# views read from them through core.routers.ReplicaRouter.
+
+DATABASE_REPLICAS = []
+for number, replica in enumerate(
+    filter(None, map(str.strip, os.environ.get('QUIZ_DB_REPLICAS', '').split(','))), start=1
+):
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        ('HOST' if DB_ENGINE == 'postgresql' else 'NAME'): replica,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# How long a user reads from the primary after writing something
+REPLICA_PIN_SECONDS = int(os.environ.get('QUIZ_REPLICA_PIN_SECONDS', 5))
+
+
+# Cache
+# QUIZ_CACHE_BACKEND=locmem (default) keeps the quiz catalog, question bundles
+# and leaderboard per process; 'file' shares them between processes on one
+# host and 'redis' (redis-py, QUIZ_REDIS_URL) between hosts.
+
+CACHE_BACKEND = os.environ.get('QUIZ_CACHE_BACKEND', 'locmem')
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR + "/db.sqlite3",
+if CACHE_BACKEND == 'redis':
+    DEFAULT_CACHE = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('QUIZ_REDIS_URL', 'redis://127.0.0.1:6379/0'),
     }
+elif CACHE_BACKEND == 'file':
+    DEFAULT_CACHE = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('QUIZ_CACHE_DIR', BASE_DIR + "/.cache"),
+    }
+else:
+    DEFAULT_CACHE = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+
+CACHES = {
+    'default': DEFAULT_CACHE,
 }
+QUIZ_CACHE_ALIAS = 'default'
+
+# Cached values are keyed by version counters (see quiz.cache), so every
+# process must read the same counters for the admin's invalidations to reach
+# them. With locmem the counters alone go to a file cache on this host.
+QUIZ_VERSION_CACHE_ALIAS = QUIZ_CACHE_ALIAS
+if CACHE_BACKEND not in ('redis', 'file'):
+    CACHES['quiz_versions'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('QUIZ_CACHE_DIR', BASE_DIR + "/.cache") + "/versions",
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    }
+    QUIZ_VERSION_CACHE_ALIAS = 'quiz_versions'
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0.6/ref/settings/#auth-password-validators
@@ -122,6 +231,22 @@ LOGIN_URL = reverse_lazy('login')
 LOGOUT_REDIRECT_URL = reverse_lazy('login')
 LOGOUT_URL = reverse_lazy('login')
 
+# Score totals are applied on a local thread pool after the request commits;
+# set QUIZ_TASKS_ASYNC to False to apply them inline instead
+QUIZ_TASKS_ASYNC = True
+QUIZ_TASK_WORKERS = 2
+
+# Answers are accepted until a question's time runs out on the server clock,
+# plus this allowance for the request in flight
+QUIZ_ANSWER_GRACE_SECONDS = 3
+
+# Idle live leaderboard streams send a comment this often, so proxies keep them open
+QUIZ_LIVE_KEEPALIVE_SECONDS = 15
+
+# Fill in missing UserScore rows after migrate and on each worker's first
+# request; otherwise run the backfill_user_scores command
+QUIZ_BACKFILL_SCORES_ON_STARTUP = os.environ.get('QUIZ_BACKFILL_SCORES_ON_STARTUP', '') == '1'
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -10,6 +10,7 @@ admin.site.index_title = "Welcome to Quiz Portal"
 urlpatterns = [
     path('login/', views.LoginView.as_view(), name="login"),
     path('logout/', views.LogoutView.as_view(), name="logout"),
+    path('metrics/', views.MetricsView.as_view(), name="metrics"),
     path('', include('quiz.urls')),
     path('admin/', admin.site.urls),
 ]
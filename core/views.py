@@ -1,5 +1,10 @@
-from django.views.generic import TemplateView
+from django.views.generic import TemplateView, View
 from django.contrib.auth import views as auth
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import JsonResponse
+from django.utils.crypto import constant_time_compare
+from core.metrics import registry
 
 
 class LoginView(auth.LoginView):
@@ -11,6 +16,24 @@ class LogoutView(auth.LogoutView):
     extra_context = {'title': "Logout"}
 
 
+class MetricsView(View):
+    def has_token(self, request):
+        token = getattr(settings, 'METRICS_TOKEN', '')
+        return bool(token) and constant_time_compare(
+            request.headers.get('Authorization', ''), f"Bearer {token}"
+        )
+
+    def get(self, request, *args, **kwargs):
+        if not (request.user.is_staff or self.has_token(request)):
+            raise PermissionDenied
+        return JsonResponse({
+            'query_budget': getattr(settings, 'METRICS_QUERY_BUDGET', None),
+            'window': registry.window,
+            'views': registry.snapshot(),
+            'database': registry.database_snapshot(),
+        })
+
+
 class ErrorView(TemplateView):
     template_name = "error.html"
 
@@ -1,10 +1,14 @@
 from django.contrib import admin
+from django.db.models import Count
 from django.utils import timezone
 from django.urls import reverse
-from django.utils.html import format_html
+from django.utils.html import format_html, format_html_join
+from django.http import StreamingHttpResponse
 
 from quiz.models import (
     Quiz,
+    Cohort,
+    CohortMembership,
     QuestionOptions,
     Question,
     UserQuiz,
@@ -14,6 +18,9 @@ from quiz.models import (
     UserReward,
     UserScore,
 )
+from quiz.cache import invalidate_catalog, invalidate_quiz
+from quiz.bank import export_rows, write_rows
+from quiz import exports
 
 
 
@@ -55,53 +62,125 @@ class QuizModelAdmin(admin.ModelAdmin):
     )
     search_fields = ('title', )
     list_filter = ('created', 'modified')
-    filter_horizontal = ('users',)
     prepopulated_fields = {'slug': ('title', )}
     inlines = [QuestionTabularInline]
-    actions = ('make_published', 'make_unpublished')
+    actions = ('make_published', 'make_unpublished', 'export_questions')
 
     def save_model(self, request, obj, form, change):
         if 'published' in form.changed_data or change:
             obj.published_at = timezone.now() if obj.published else None
         super().save_model(request, obj, form, change)
+        invalidate_quiz(obj.id)
+        # A quiz moved to another level drops out of the old level's listing too
+        level_ids = {obj.level_id, form.initial.get('level')} - {None}
+        invalidate_catalog(*Level.objects.filter(id__in=level_ids).values_list('slug', flat=True))
 
     def make_published(self, request, queryset):
+        quizzes = list(queryset.values_list('id', 'level__slug'))
         queryset.update(published=True, published_at=timezone.now())
+        for quiz_id, _ in quizzes:
+            invalidate_quiz(quiz_id)
+        invalidate_catalog(*(level_slug for _, level_slug in quizzes))
     make_published.short_description = "Published selected quizzes"
 
     def make_unpublished(self, request, queryset):
+        quizzes = list(queryset.values_list('id', 'level__slug'))
         queryset.update(published=False, published_at=None)
+        for quiz_id, _ in quizzes:
+            invalidate_quiz(quiz_id)
+        invalidate_catalog(*(level_slug for _, level_slug in quizzes))
     make_unpublished.short_description = "Unpublished selected quizzes"
 
+    def export_questions(self, request, queryset):
+        response = StreamingHttpResponse(
+            write_rows(export_rows(queryset), 'jsonl'),
+            content_type='application/x-ndjson',
+        )
+        response['Content-Disposition'] = 'attachment; filename="questions.jsonl"'
+        return response
+    export_questions.short_description = "Export questions of selected quizzes (JSON Lines)"
+
     class Media:
         css = {
             'all': ('css/admin_custom.css',),  # Link to your custom CSS file
         }
 
 
+def _stats(obj):
+    # Questions and options nobody has been served yet have no stats row
+    return getattr(obj, 'stats', None) if obj.pk else None
+
+
+def _percent(value):
+    return f"{value:.0%}" if value is not None else "-"
+
+
 class QuestionOptionsTabularInline(admin.TabularInline):
     model = QuestionOptions
     extra = 0
     min_num = 3
     max_num = 6
+    readonly_fields = ('pick_rate', )
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('stats')
+
+    @admin.display(description='Picked')
+    def pick_rate(self, obj):
+        stats = _stats(obj)
+        return f"{_percent(stats.pick_rate)} ({stats.picks})" if stats else "-"
+
 @admin.register(Question)
 class QuestionModelAdmin(admin.ModelAdmin):
     inlines = (QuestionOptionsTabularInline, )
-    list_display = ('question', 'quiz', 'modified', 'created')
+    list_display = ('question', 'quiz', 'difficulty', 'discrimination', 'avg_time', 'modified', 'created')
+    list_select_related = ('quiz', 'stats')
     list_filter = ('quiz', 'created',)
     search_fields = ('question', 'quiz__title')
     autocomplete_fields = ('quiz', )
+    readonly_fields = ('item_analysis', )
+
+    # Filled in by the analyze_items command
+    @admin.display(description='Correct', ordering='stats__difficulty')
+    def difficulty(self, obj):
+        stats = _stats(obj)
+        return _percent(stats.difficulty) if stats else "-"
+
+    @admin.display(description='Discrimination', ordering='stats__discrimination')
+    def discrimination(self, obj):
+        stats = _stats(obj)
+        return f"{stats.discrimination:.2f}" if stats and stats.discrimination is not None else "-"
+
+    @admin.display(description='Avg. time', ordering='stats__avg_time')
+    def avg_time(self, obj):
+        stats = _stats(obj)
+        return f"{stats.avg_time:.1f}s" if stats and stats.avg_time is not None else "-"
+
+    @admin.display(description='Item analysis')
+    def item_analysis(self, obj):
+        stats = _stats(obj)
+        if not stats:
+            return "Not served in any analyzed attempt yet"
+        return (
+            f"Served {stats.served} times, answered {stats.answered}, {_percent(stats.difficulty)} correct; "
+            f"discrimination {self.discrimination(obj)}, {self.avg_time(obj)} on average"
+        )
 
 
 class UserQuestionAnsInline(admin.TabularInline):
     model = UserQuestionAnswer
-    readonly_fields = ('user_quiz', 'question', 'answer', 'answer_correct')
+    readonly_fields = ('user_quiz', 'question', 'answer', 'answer_correct', 'served_at', 'answered_at')
     extra = 0
     # can_delete = False
 
     @admin.display(description='Correct?', boolean=True)
     def answer_correct(self, obj):
-        return obj.answer.answer
+        return obj.answer.answer if obj.answer else None
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'user_quiz__quiz', 'user_quiz__user', 'question', 'answer'
+        )
 
 @admin.register(UserQuiz)
 class UserQuizAdmin(admin.ModelAdmin):
@@ -119,9 +198,57 @@ class UserQuizAdmin(admin.ModelAdmin):
         'end_time',
         'full_time',
     )
+    list_select_related = ('quiz', 'user')
     list_filter = ('quiz', 'created',)
     search_fields = ('user', 'quiz__title')
     autocomplete_fields = ('quiz', )
+    readonly_fields = ('answer_sheet', )
+    actions = ('export_attempts', 'export_answers')
+
+    def get_inlines(self, request, obj):
+        # Packed attempts have no answer rows left to edit, answer_sheet shows them
+        if obj and obj.answers_packed:
+            return ()
+        return super().get_inlines(request, obj)
+
+    @admin.display(description='Answers')
+    def answer_sheet(self, obj):
+        records = obj.answer_records() if obj.pk else []
+        if not records:
+            return "-"
+        questions = dict(Question.objects.filter(
+            id__in={record.question_id for record in records}).values_list('id', 'question'))
+        options = dict(QuestionOptions.objects.filter(
+            id__in={record.option_id for record in records if record.option_id}
+        ).values_list('id', 'option'))
+        rows = format_html_join('', '<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>', (
+            (
+                questions.get(record.question_id, record.question_id),
+                options.get(record.option_id, '-'),
+                ('Yes' if record.is_correct else 'No') if record.option_id else '-',
+                f"{(record.answered_at - record.served_at).total_seconds():.1f}s" if record.answered_at else '-',
+            )
+            for record in records
+        ))
+        return format_html(
+            '<table><tr><th>Question</th><th>Answer</th><th>Correct?</th><th>Time</th></tr>{}</table>',
+            rows,
+        )
+
+    def _stream(self, rows, fields, filename):
+        response = StreamingHttpResponse(
+            exports.write_rows(rows, fields, 'csv'), content_type='text/csv'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    def export_attempts(self, request, queryset):
+        return self._stream(exports.attempt_rows(queryset), exports.ATTEMPT_FIELDS, 'attempts.csv')
+    export_attempts.short_description = "Export selected attempts (CSV)"
+
+    def export_answers(self, request, queryset):
+        return self._stream(exports.answer_rows(queryset), exports.ANSWER_FIELDS, 'answers.csv')
+    export_answers.short_description = "Export answers of selected attempts (CSV)"
 
 class QuizInline(admin.TabularInline):
     model = Quiz
@@ -154,3 +281,28 @@ class UserRewardAdmin(admin.ModelAdmin):
 class UserScoreAdmin(admin.ModelAdmin):
     list_display = ('user', 'total_score')
     search_fields = ('user__username',)
+
+@admin.register(Cohort)
+class CohortAdmin(admin.ModelAdmin):
+    # Members are managed from CohortMembershipAdmin or the enroll_cohort command,
+    # an inline would render every membership row
+    list_display = ('name', 'member_count', 'created', 'modified')
+    search_fields = ('name', )
+    filter_horizontal = ('quizzes', 'levels')
+    prepopulated_fields = {'slug': ('name', )}
+
+    def get_queryset(self, request):
+        # One grouped query for the changelist instead of a count per cohort
+        return super().get_queryset(request).annotate(members_count=Count('members'))
+
+    @admin.display(description='Members', ordering='members_count')
+    def member_count(self, obj):
+        return obj.members_count
+
+@admin.register(CohortMembership)
+class CohortMembershipAdmin(admin.ModelAdmin):
+    list_display = ('user', 'cohort', 'created')
+    list_select_related = ('user', 'cohort')
+    list_filter = ('cohort', )
+    search_fields = ('user__username', 'cohort__name')
+    raw_id_fields = ('user', )
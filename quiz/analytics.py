@@ -0,0 +1,167 @@
+from collections import defaultdict
+from django.db import transaction
+from django.utils import timezone
+from quiz.models import (
+    ANSWER_RECORD_WIDTH, AnswerRecord, OptionStats, Question, QuestionOptions,
+    QuestionStats, UserQuestionAnswer, UserQuiz, pack_answers,
+)
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_BATCH_SIZE = 1000
+# Columns of the answer matrix, the layout of models.pack_answers
+QUESTION, OPTION, CORRECT, SERVED_AT, ANSWERED_AT = range(ANSWER_RECORD_WIDTH)
+COUNT_FIELDS = ('served', 'answered', 'correct', 'score_sum', 'score_squares', 'correct_score_sum')
+SUM_FIELDS = (*COUNT_FIELDS, 'time_sum')
+
+
+def answer_logs(attempts):
+    """Packed answers of (id, answers_packed, answer_log) attempts, packing the
+    ones compact_attempt hasn't got to yet from their rows in one query."""
+    unpacked = [user_quiz_id for user_quiz_id, packed, _ in attempts if not packed]
+    records = defaultdict(list)
+    if unpacked:
+        rows = UserQuestionAnswer.objects.filter(user_quiz_id__in=unpacked).order_by('id').values_list(
+            'user_quiz_id', 'question_id', 'answer_id', 'answer__answer', 'served_at', 'answered_at'
+        )
+        for user_quiz_id, *record in rows:
+            records[user_quiz_id].append(AnswerRecord(*record))
+    return [
+        answer_log if packed else pack_answers(records[user_quiz_id])
+        for user_quiz_id, packed, answer_log in attempts
+    ]
+
+
+def answer_matrix(logs):
+    """Stack packed answers (little-endian, see models.pack_answers) into one
+    int64 matrix, with each row's attempt index."""
+    blocks = [np.frombuffer(log, dtype='<i8').reshape(-1, ANSWER_RECORD_WIDTH) for log in logs]
+    attempt = np.repeat(np.arange(len(blocks)), [len(block) for block in blocks])
+    if not blocks:
+        return np.empty((0, ANSWER_RECORD_WIDTH), dtype=np.int64), attempt
+    return np.concatenate(blocks), attempt
+
+
+def item_sums(matrix, attempt):
+    """Per-question sums and per-option picks of a batch of answers.
+
+    Returns (question_ids, {field: column}, {option_id: picks}), the columns
+    aligned with question_ids.
+    """
+    question_ids, question = np.unique(matrix[:, QUESTION], return_inverse=True)
+    answered = matrix[:, ANSWERED_AT] != 0
+    correct = matrix[:, CORRECT].astype(np.float64)
+    seconds = np.where(answered, np.clip(matrix[:, ANSWERED_AT] - matrix[:, SERVED_AT], 0, None) / 1e6, 0)
+    # Every answer is set against the score of the attempt it belongs to
+    score = np.bincount(attempt, weights=correct, minlength=attempt.max(initial=-1) + 1)[attempt]
+
+    def per_question(weights=None):
+        return np.bincount(question, weights=weights, minlength=len(question_ids))
+
+    sums = {
+        'served': per_question(),
+        'answered': per_question(answered.astype(np.float64)),
+        'correct': per_question(correct),
+        'score_sum': per_question(score),
+        'score_squares': per_question(score * score),
+        'correct_score_sum': per_question(score * correct),
+    }
+    sums = {field: np.rint(column).astype(np.int64) for field, column in sums.items()}
+    sums['time_sum'] = per_question(seconds)
+
+    option_ids, picks = np.unique(matrix[answered & (matrix[:, OPTION] > 0), OPTION], return_counts=True)
+    return question_ids.tolist(), sums, dict(zip(option_ids.tolist(), picks.tolist()))
+
+
+def derived_stats(served, answered, correct, score_sum, score_squares, correct_score_sum, time_sum):
+    """Difficulty, discrimination and average time from the running sums, as
+    arrays with NaN where there is too little data."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        difficulty = correct / served
+        # Point-biserial: the correlation of the 0/1 item with the attempt's score
+        discrimination = (served * correct_score_sum - correct * score_sum) / np.sqrt(
+            (served * correct - correct * correct) * (served * score_squares - score_sum * score_sum)
+        )
+        avg_time = time_sum / answered
+    return difficulty, discrimination, avg_time
+
+
+def _nullable(value):
+    return value if np.isfinite(value) else None
+
+
+def fold_sums(question_ids, sums, picks):
+    """Add a batch's sums to the stored stats and recompute what derives from them."""
+    now = timezone.now()
+    # Packed answers may name questions deleted since
+    known = set(Question.objects.filter(id__in=question_ids).values_list('id', flat=True))
+    stored = QuestionStats.objects.select_for_update().in_bulk(known)
+    stats = []
+    for index, question_id in enumerate(question_ids):
+        if question_id not in known:
+            continue
+        stat = stored.get(question_id) or QuestionStats(question_id=question_id)
+        for field in SUM_FIELDS:
+            setattr(stat, field, getattr(stat, field) + sums[field][index].item())
+        stats.append(stat)
+    if not stats:
+        return
+
+    columns = [np.array([getattr(stat, field) for stat in stats], dtype=np.float64) for field in SUM_FIELDS]
+    for stat, difficulty, discrimination, avg_time in zip(stats, *derived_stats(*columns)):
+        stat.difficulty, stat.discrimination, stat.avg_time = (
+            _nullable(difficulty), _nullable(discrimination), _nullable(avg_time)
+        )
+        stat.modified = now
+    QuestionStats.objects.bulk_update(
+        [stat for stat in stats if stat.question_id in stored],
+        [*SUM_FIELDS, 'difficulty', 'discrimination', 'avg_time', 'modified'],
+    )
+    QuestionStats.objects.bulk_create([stat for stat in stats if stat.question_id not in stored])
+
+    # Every option of a served question has a new pick rate, picked this batch or not
+    served = {stat.question_id: stat.served for stat in stats}
+    options = QuestionOptions.objects.filter(question_id__in=served).values_list('id', 'question_id')
+    stored_options = OptionStats.objects.select_for_update().in_bulk([option_id for option_id, _ in options])
+    option_stats = []
+    for option_id, question_id in options:
+        option_stat = stored_options.get(option_id) or OptionStats(option_id=option_id)
+        option_stat.picks += picks.get(option_id, 0)
+        option_stat.pick_rate = option_stat.picks / served[question_id]
+        option_stat.modified = now
+        option_stats.append(option_stat)
+    OptionStats.objects.bulk_update(
+        [stat for stat in option_stats if stat.option_id in stored_options],
+        ['picks', 'pick_rate', 'modified'],
+    )
+    OptionStats.objects.bulk_create([stat for stat in option_stats if stat.option_id not in stored_options])
+
+
+def analyze_items(batch_size=ANALYSIS_BATCH_SIZE):
+    """Fold the completed attempts not analyzed yet into the item stats, a
+    batch per transaction. Returns how many attempts were analyzed."""
+    pending = UserQuiz.objects.filter(is_completed=True, items_analyzed=False).order_by('id')
+    analyzed = 0
+    while True:
+        with transaction.atomic():
+            user_quiz_ids = list(pending.select_for_update().values_list('id', flat=True)[:batch_size])
+            if not user_quiz_ids:
+                break
+            UserQuiz.objects.filter(id__in=user_quiz_ids).update(items_analyzed=True)
+            # Read after claiming, compact_attempt may have packed some meanwhile
+            attempts = UserQuiz.objects.filter(id__in=user_quiz_ids).values_list(
+                'id', 'answers_packed', 'answer_log')
+            fold_sums(*item_sums(*answer_matrix(answer_logs(list(attempts)))))
+        analyzed += len(user_quiz_ids)
+        logger.debug(f"Analyzed {analyzed} attempts")
+    return analyzed
+
+
+def reset_items():
+    """Drop the stats so the next analyze_items run starts over from every attempt."""
+    with transaction.atomic():
+        OptionStats.objects.all().delete()
+        QuestionStats.objects.all().delete()
+        UserQuiz.objects.filter(items_analyzed=True).update(items_analyzed=False)
@@ -0,0 +1,153 @@
+from django.http import Http404, JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views import View
+from quiz import services
+from quiz.cache import get_bundle
+from quiz.views import QuizMixin
+import json
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def question_payload(user_quiz, question, served_at):
+    # No correctness here, the client learns it from the answer response
+    time_left = question.time - (timezone.now() - served_at).total_seconds()
+    return {
+        'id': question.pk,
+        'text': question.question,
+        'time': max(math.ceil(time_left), 0),  # By the server's clock
+        'options': [[option.pk, option.option] for option in question.options],
+        'number': user_quiz.answered_count,
+        'of': user_quiz.total_questions,
+    }
+
+
+def result_payload(user_quiz):
+    return {
+        'completed': user_quiz.is_completed,
+        'score': user_quiz.score,
+        'total': user_quiz.total_questions,
+        'points': int(user_quiz.calculated_score),
+        'url': reverse('quiz:quiz_complete', args=[user_quiz.quiz.slug]),
+    }
+
+
+class ApiMixin(QuizMixin):
+    """JSON endpoints for the quiz-taking flow, sharing QuizMixin's access rules."""
+
+    def dispatch(self, request, *args, **kwargs):
+        # JSON clients get a status code instead of the login redirect
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': "authentication required"}, status=401)
+        try:
+            return super(QuizMixin, self).dispatch(request, *args, **kwargs)
+        except Http404 as e:
+            return JsonResponse({'error': str(e) or "not found"}, status=404)
+
+    def load_attempt(self):
+        self.user_quiz = self.get_user_quiz_by_slug()
+        if not self.user_quiz:
+            raise Http404("Quiz not started")
+        self.quiz = self.user_quiz.quiz
+        self.bundle = get_bundle(self.quiz)
+
+    def current_question(self, skipped=None):
+        """The served, unanswered question, serving the next one when there is none."""
+        if self.user_quiz.is_completed:
+            return None
+        question, self.served_at = services.pending_question(self.user_quiz, self.bundle)
+        if question is None or question.pk == skipped:
+            question, self.served_at = services.serve_question(self.user_quiz, self.bundle)
+            if question is None:
+                services.complete_attempt(self.user_quiz)
+        return question
+
+    def state(self, question):
+        return {
+            'question': question_payload(self.user_quiz, question, self.served_at) if question else None,
+            'result': result_payload(self.user_quiz),
+        }
+
+    def conditional(self, request, data, etag, status=200):
+        response = JsonResponse(data, status=status)
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return get_conditional_response(request, etag=etag, response=response)
+
+
+class StartAttempt(ApiMixin, View):
+    def post(self, request, *args, **kwargs):
+        quiz = self.get_quiz()
+        if quiz.is_closed:
+            return JsonResponse({'error': "quiz is closed"}, status=409)
+        services.start_attempt(request.user, quiz)
+        self.load_attempt()
+        return JsonResponse(self.state(self.current_question()), status=201)
+
+
+class CurrentQuestion(ApiMixin, View):
+    def get(self, request, *args, **kwargs):
+        self.load_attempt()
+        question = self.current_question()
+        etag = (
+            f'"q{self.user_quiz.pk}-{self.user_quiz.answered_count}'
+            f'-{question.pk if question else 0}-{self.bundle.version}"'
+        )
+        return self.conditional(request, self.state(question), etag)
+
+
+class SubmitAnswer(ApiMixin, View):
+    def post(self, request, *args, **kwargs):
+        self.load_attempt()
+        if request.content_type == 'application/json':
+            try:
+                data = json.loads(request.body or b'{}')
+            except ValueError:
+                return JsonResponse({'error': "invalid JSON"}, status=400)
+            if not isinstance(data, dict):
+                return JsonResponse({'error': "expected a JSON object"}, status=400)
+        else:
+            data = request.POST
+
+        question_id = str(data.get('question', ''))
+        if not question_id.isdigit() or int(question_id) not in self.bundle.questions:
+            raise Http404("Question not found")
+        # Only the question being served can be answered or skipped, anything
+        # else would hand out answers to questions the user hasn't seen
+        question = None
+        if not self.user_quiz.is_completed:
+            question, _ = services.pending_question(self.user_quiz, self.bundle)
+        if question is None or question.pk != int(question_id):
+            return JsonResponse({'error': "question is not being served"}, status=409)
+        correct_id = next((option.pk for option in question.options if option.answer), None)
+
+        correct, answer, skipped = None, None, None
+        option_id = str(data.get('option') or '')
+        if option_id:
+            option = next((option for option in question.options if str(option.pk) == option_id), None)
+            if not option:
+                raise Http404("Option not found")
+            if self.user_quiz.record_answer(question, option):
+                correct, answer = option.answer, correct_id
+        else:
+            # Timed out or skipped, it stays unanswered and the next one is served
+            skipped, answer = question.pk, correct_id
+
+        # The next question rides along, so answering is a single round trip
+        return JsonResponse({
+            'correct': correct, 'answer': answer, **self.state(self.current_question(skipped)),
+        })
+
+
+class AttemptResult(ApiMixin, View):
+    def get(self, request, *args, **kwargs):
+        self.load_attempt()
+        etag = (
+            f'"r{self.user_quiz.pk}-{self.user_quiz.answered_count}-{self.user_quiz.correct_count}'
+            f'-{int(self.user_quiz.is_completed)}"'
+        )
+        return self.conditional(request, result_payload(self.user_quiz), etag)
@@ -1,19 +1,24 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
+from django.db.models.signals import post_migrate
+
+
+def backfill_user_scores(**kwargs):
+    from quiz.services import backfill_user_scores
+    # Once per process is enough, signups get theirs from quiz.signals
+    request_started.disconnect(dispatch_uid='quiz_backfill_user_scores')
+    backfill_user_scores()
 
 
 class QuizConfig(AppConfig):
     name = 'quiz'
     def ready(self):
         import quiz.signals  # Ensure the signals are loaded
-        self.create_missing_user_score()
-
-    def create_missing_user_score(self):
-        from django.contrib.auth import get_user_model
-        from quiz.models import UserScore
-
-        User = get_user_model()
-        # Iterate through all users
-        for user in User.objects.all():
-            user_score, created = UserScore.objects.get_or_create(user=user)
-            if created:
-                print(f"Created UserScore for user {user.username}")
+        # No queries here: ready() runs for every process and management command,
+        # migrate included, before the tables may exist. Missing scores are filled
+        # by the backfill_user_scores command, or opt in to do it after migrate and
+        # on each worker's first request
+        if getattr(settings, 'QUIZ_BACKFILL_SCORES_ON_STARTUP', False):
+            post_migrate.connect(backfill_user_scores, sender=self)
+            request_started.connect(backfill_user_scores, dispatch_uid='quiz_backfill_user_scores')
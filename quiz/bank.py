@@ -0,0 +1,254 @@
+import csv
+import json
+import time
+from functools import lru_cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from quiz import exports
+from quiz.cache import invalidate_quiz
+from quiz.models import Level, Question, QuestionOptions, Quiz
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Same bounds as QuestionOptionsTabularInline in the admin
+MIN_OPTIONS = 3
+MAX_OPTIONS = 6
+CSV_FIELDS = (
+    'level', 'quiz', 'quiz_title', 'question', 'time',
+    *(f'option_{i}' for i in range(1, MAX_OPTIONS + 1)), 'correct',
+)
+# exports.write_rows takes (name, lookup) pairs, only the names matter here
+CSV_COLUMNS = tuple((name, name) for name in CSV_FIELDS)
+
+
+class BankError(ValueError):
+    pass
+
+
+def detect_format(path):
+    return 'csv' if str(path).lower().endswith('.csv') else 'jsonl'
+
+
+def read_jsonl(stream):
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, BankError(f"invalid JSON: {e}")
+
+
+def read_csv(stream):
+    # Line 1 is the header
+    for line_number, record in enumerate(csv.DictReader(stream), start=2):
+        options = [
+            record.get(f'option_{i}') for i in range(1, MAX_OPTIONS + 1)
+        ]
+        options = [option for option in options if option]
+        try:
+            correct = int(record.get('correct') or 0)
+        except ValueError:
+            yield line_number, BankError("correct must be the number of the right option")
+            continue
+        yield line_number, {
+            'level': record.get('level'),
+            'quiz': record.get('quiz'),
+            'quiz_title': record.get('quiz_title'),
+            'question': record.get('question'),
+            'time': record.get('time'),
+            'options': [
+                {'option': option, 'answer': i == correct}
+                for i, option in enumerate(options, start=1)
+            ],
+        }
+
+
+def read_rows(stream, fmt):
+    return read_csv(stream) if fmt == 'csv' else read_jsonl(stream)
+
+
+def validate(instance, exclude=()):
+    """Check a row against the model's own field rules. Uniqueness is left to
+    BankImporter, which reuses existing slugs."""
+    try:
+        instance.full_clean(exclude=exclude, validate_unique=False, validate_constraints=False)
+    except ValidationError as e:
+        raise BankError("; ".join(
+            f"{instance._meta.model_name} {field}: {' '.join(messages)}"
+            for field, messages in e.message_dict.items()
+        ))
+
+
+def clean_row(row):
+    if isinstance(row, BankError):
+        raise row
+    if not isinstance(row, dict):
+        raise BankError("each row must be an object")
+    for field in ('level', 'quiz', 'question'):
+        if not str(row.get(field) or '').strip():
+            raise BankError(f"{field} is required")
+
+    options = row.get('options') or []
+    if not isinstance(options, list) or not all(isinstance(option, dict) for option in options):
+        raise BankError("options must be a list of objects")
+    if not MIN_OPTIONS <= len(options) <= MAX_OPTIONS:
+        raise BankError(f"a question needs {MIN_OPTIONS} to {MAX_OPTIONS} options, got {len(options)}")
+    correct = sum(bool(option.get('answer')) for option in options)
+    if correct != 1:
+        raise BankError(f"a question needs exactly one correct option, got {correct}")
+
+    try:
+        question_time = int(row.get('time') or Question._meta.get_field('time').default)
+    except (TypeError, ValueError):
+        raise BankError("time must be a number of seconds")
+    cleaned = {
+        'level': str(row['level']).strip(),
+        'level_name': str(row.get('level_name') or row['level']).strip(),
+        'quiz': str(row['quiz']).strip(),
+        'quiz_title': str(row.get('quiz_title') or row['quiz']).strip(),
+        'question': str(row['question']).strip(),
+        'time': question_time,
+        'options': [
+            {'option': str(option.get('option') or '').strip(), 'answer': bool(option.get('answer'))}
+            for option in options
+        ],
+    }
+
+    validate_quiz(cleaned['level'], cleaned['level_name'], cleaned['quiz'], cleaned['quiz_title'])
+    validate(Question(question=cleaned['question'], time=cleaned['time']), exclude=['quiz'])
+    option_field = QuestionOptions._meta.get_field('option')
+    for option in cleaned['options']:
+        try:
+            option_field.clean(option['option'], None)
+        except ValidationError as e:
+            raise BankError(f"option: {' '.join(e.messages)}")
+    return cleaned
+
+
+@lru_cache(maxsize=1024)
+def validate_quiz(level, level_name, quiz, quiz_title):
+    # Rows of one quiz repeat these, so each combination is checked once. The
+    # importer creates levels and quizzes without a description
+    validate(Level(slug=level, name=level_name), exclude=['description'])
+    validate(Quiz(slug=quiz, title=quiz_title), exclude=['level', 'description'])
+
+
+class BankImporter:
+    """Streams question rows into the database in batched transactions."""
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.levels = {}
+        self.quizzes = {}
+        self.imported = 0
+        self.errors = []
+        self.seconds = 0.0
+
+    def run(self, rows):
+        started = time.perf_counter()
+        batch = []
+        for line_number, row in rows:
+            try:
+                row = clean_row(row)
+                # Resolved outside the batch transaction, so a conflict costs one row
+                self.get_quiz(row['quiz'], row['quiz_title'], row['level'], row['level_name'])
+                batch.append(row)
+            except BankError as e:
+                self.errors.append((line_number, str(e)))
+                continue
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+        if batch:
+            self.flush(batch)
+        self.seconds = time.perf_counter() - started
+        return self
+
+    @property
+    def rows_per_second(self):
+        return self.imported / self.seconds if self.seconds else 0.0
+
+    def get_level(self, slug, name):
+        if slug not in self.levels:
+            level = Level.objects.filter(slug=slug).first()
+            if level is None:
+                if Level.objects.filter(name=name).exists():
+                    raise BankError(f"level name {name!r} already belongs to another level")
+                level = Level.objects.create(slug=slug, name=name, description='')
+            self.levels[slug] = level
+        return self.levels[slug]
+
+    def get_quiz(self, slug, title, level_slug, level_name):
+        if slug not in self.quizzes:
+            quiz = Quiz.objects.filter(slug=slug).first()
+            if quiz is None:
+                quiz = Quiz.objects.create(
+                    slug=slug, title=title, description='',
+                    level=self.get_level(level_slug, level_name),
+                )
+            self.quizzes[slug] = quiz
+        return self.quizzes[slug]
+
+    def flush(self, batch):
+        with transaction.atomic():
+            questions = Question.objects.bulk_create([
+                Question(quiz=self.quizzes[row['quiz']], question=row['question'], time=row['time'])
+                for row in batch
+            ])
+            QuestionOptions.objects.bulk_create([
+                QuestionOptions(question=question, option=option['option'], answer=option['answer'])
+                for question, row in zip(questions, batch)
+                for option in row['options']
+            ])
+
+            # bulk_create skips the signals that keep these in sync
+            added = {}
+            for question in questions:
+                added[question.quiz_id] = added.get(question.quiz_id, 0) + 1
+            for quiz_id, count in added.items():
+                Quiz.objects.filter(id=quiz_id).update(question_count=F('question_count') + count)
+        for quiz_id in added:
+            invalidate_quiz(quiz_id)
+
+        self.imported += len(questions)
+        logger.debug(f"Imported a batch of {len(questions)} questions")
+
+
+def export_rows(quizzes, chunk_size=2000):
+    questions = Question.objects.filter(quiz__in=quizzes).select_related(
+        'quiz__level'
+    ).prefetch_related('questionoptions_set').order_by('quiz_id', 'id')
+    for question in questions.iterator(chunk_size=chunk_size):
+        yield {
+            'level': question.quiz.level.slug,
+            'level_name': question.quiz.level.name,
+            'quiz': question.quiz.slug,
+            'quiz_title': question.quiz.title,
+            'question': question.question,
+            'time': question.time,
+            'options': [
+                {'option': option.option, 'answer': option.answer}
+                for option in question.questionoptions_set.all()
+            ],
+        }
+
+
+def csv_row(row):
+    options = row['options'][:MAX_OPTIONS]
+    correct = next((i for i, option in enumerate(options, start=1) if option['answer']), '')
+    return dict(zip(CSV_FIELDS, [
+        row['level'], row['quiz'], row['quiz_title'], row['question'], row['time'],
+        *(option['option'] for option in options),
+        *([''] * (MAX_OPTIONS - len(options))),
+        correct,
+    ]))
+
+
+def write_rows(rows, fmt):
+    """Yield the exported rows as text chunks, ready for a file or a streaming response."""
+    if fmt == 'csv':
+        rows = (csv_row(row) for row in rows)
+    return exports.write_rows(rows, CSV_COLUMNS, fmt)
@@ -0,0 +1,166 @@
+import hashlib
+import time
+from typing import NamedTuple
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+from quiz.models import Level, Question, QuestionOptions, Quiz
+import logging
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'quiz:version:{name}'
+BUNDLE_KEY = 'quiz:bundle:{quiz_id}:{version}'
+BUNDLE_TIMEOUT = 60 * 60 * 24
+LOCAL_BUNDLES_MAX = 256
+CATALOG_TIMEOUT = 60 * 10
+# Cached values outlive the request, so they are never built from a lagging replica
+PRIMARY = DEFAULT_DB_ALIAS
+
+_local_bundles = {}
+
+
+def quiz_cache():
+    return caches[getattr(settings, 'QUIZ_CACHE_ALIAS', 'default')]
+
+
+def version_cache():
+    # Shared by every process even when quiz_cache() is per process, see settings
+    return caches[getattr(settings, 'QUIZ_VERSION_CACHE_ALIAS', 'default')]
+
+
+def get_version(name):
+    # Versions start from the clock so an evicted counter never reuses an old value
+    return version_cache().get_or_set(
+        VERSION_KEY.format(name=name), time.time_ns() // 1000, None
+    )
+
+
+def bump_version(name):
+    key = VERSION_KEY.format(name=name)
+    try:
+        return version_cache().incr(key)
+    except ValueError:
+        return get_version(name)
+
+
+class CachedOption(NamedTuple):
+    pk: int
+    option: str
+    answer: bool
+
+
+class CachedQuestion(NamedTuple):
+    pk: int
+    question: str
+    time: int
+    options: tuple
+
+
+class QuizBundle(NamedTuple):
+    quiz_id: int
+    version: int
+    questions: dict  # question pk -> CachedQuestion, in creation order
+
+    @property
+    def total_time(self):
+        return sum(question.time for question in self.questions.values())
+
+
+def build_bundle(quiz_id, version):
+    options = {}
+    for option in QuestionOptions.objects.using(PRIMARY).filter(question__quiz_id=quiz_id).order_by('id'):
+        options.setdefault(option.question_id, []).append(
+            CachedOption(option.pk, option.option, option.answer)
+        )
+    questions = {
+        question.pk: CachedQuestion(
+            question.pk, question.question, question.time,
+            tuple(options.get(question.pk, ())),
+        )
+        for question in Question.objects.using(PRIMARY).filter(quiz_id=quiz_id).order_by('id')
+    }
+    return QuizBundle(quiz_id, version, questions)
+
+
+def get_bundle(quiz):
+    version = get_version(f'quiz:{quiz.id}')
+    bundle = _local_bundles.get(quiz.id)
+    if bundle is not None and bundle.version == version:
+        return bundle
+
+    key = BUNDLE_KEY.format(quiz_id=quiz.id, version=version)
+    bundle = quiz_cache().get(key)
+    if bundle is None:
+        bundle = build_bundle(quiz.id, version)
+        # Drafts are still being edited, only published content is shared
+        if quiz.published:
+            quiz_cache().set(key, bundle, BUNDLE_TIMEOUT)
+        logger.debug(f"Built question bundle for quiz {quiz.id} version {version}")
+
+    if len(_local_bundles) >= LOCAL_BUNDLES_MAX:
+        _local_bundles.clear()
+    _local_bundles[quiz.id] = bundle
+    return bundle
+
+
+def invalidate_quiz(quiz_id):
+    bump_version(f'quiz:{quiz_id}')
+    _local_bundles.pop(quiz_id, None)
+
+
+def get_or_build(key, build, timeout=CATALOG_TIMEOUT):
+    value = quiz_cache().get(key)
+    if value is None:
+        value = build()
+        quiz_cache().set(key, value, timeout)
+    return value
+
+
+def catalog_levels():
+    return get_or_build(
+        f"quiz:catalog:levels:{get_version('levels')}",
+        lambda: list(Level.objects.using(PRIMARY).all()),
+    )
+
+
+def catalog_level(slug):
+    """The level with this slug and its published quizzes, or (None, [])."""
+    def build():
+        level = Level.objects.using(PRIMARY).filter(slug=slug).first()
+        quizzes = list(Quiz.objects.using(PRIMARY).filter(level=level, published=True)) if level else []
+        return level, quizzes
+
+    return get_or_build(f"quiz:catalog:level:{slug}:{get_version(f'level:{slug}')}", build)
+
+
+def catalog_quizzes(quiz_ids):
+    """Open published quizzes among quiz_ids, ordered by end_date.
+
+    Entries are keyed by the access set rather than the user, so everyone
+    with the same access shares one cached list.
+    """
+    digest = hashlib.sha1(','.join(map(str, sorted(quiz_ids))).encode()).hexdigest()
+    quizzes = get_or_build(
+        f"quiz:catalog:quizzes:{digest}:{get_version('quizzes')}",
+        lambda: list(Quiz.objects.using(PRIMARY).filter(
+            id__in=quiz_ids, published=True, end_date__isnull=False
+        ).order_by('end_date')),
+    )
+    now = timezone.now()
+    return [quiz for quiz in quizzes if quiz.end_date >= now]
+
+
+def invalidate_catalog(*level_slugs):
+    bump_version('quizzes')
+    # Level-wide grants cover the quizzes a level has now, see quiz.entitlements
+    bump_version('grants')
+    for slug in set(level_slugs):
+        bump_version(f'level:{slug}')
+
+
+def invalidate_levels(*level_slugs):
+    bump_version('levels')
+    for slug in set(level_slugs):
+        bump_version(f'level:{slug}')
@@ -0,0 +1,68 @@
+from quiz.cache import PRIMARY, bump_version, get_or_build, get_version
+from quiz.models import Cohort, CohortMembership, Quiz
+import logging
+
+logger = logging.getLogger(__name__)
+
+ACCESS_KEY = 'quiz:access:{user_id}:{user_version}:{grants_version}'
+ENROLL_BATCH_SIZE = 5000
+
+
+def entitled_quiz_ids(user_id):
+    """Ids of every quiz the user is entitled to, as a single query."""
+    cohort_ids = CohortMembership.objects.filter(user_id=user_id).values('cohort_id')
+    direct = Cohort.quizzes.through.objects.filter(
+        cohort_id__in=cohort_ids).values_list('quiz_id', flat=True)
+    by_level = Quiz.objects.filter(level__in=Cohort.levels.through.objects.filter(
+        cohort_id__in=cohort_ids).values('level_id')).values_list('id', flat=True)
+    return direct.union(by_level)
+
+
+def accessible_quiz_ids(user):
+    key = ACCESS_KEY.format(
+        user_id=user.pk,
+        user_version=get_version(f'user:{user.pk}'),
+        grants_version=get_version('grants'),
+    )
+    return get_or_build(key, lambda: frozenset(entitled_quiz_ids(user.pk).using(PRIMARY)))
+
+
+def can_access(user, quiz_id):
+    return quiz_id in accessible_quiz_ids(user)
+
+
+def invalidate_members(*user_ids):
+    for user_id in set(user_ids):
+        bump_version(f'user:{user_id}')
+
+
+def invalidate_grants():
+    # Grant changes touch every member of a cohort, so they expire all sets at once
+    bump_version('grants')
+
+
+def enroll(cohort, user_ids, batch_size=ENROLL_BATCH_SIZE):
+    """Add users to a cohort; existing members are skipped. Returns the ids given."""
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), batch_size):
+        CohortMembership.objects.bulk_create(
+            (CohortMembership(cohort=cohort, user_id=user_id)
+             for user_id in user_ids[start:start + batch_size]),
+            batch_size=batch_size, ignore_conflicts=True,
+        )
+    invalidate_members(*user_ids)
+    logger.debug(f"Enrolled {len(user_ids)} users in cohort {cohort}")
+    return user_ids
+
+
+def unenroll(cohort, user_ids, batch_size=ENROLL_BATCH_SIZE):
+    user_ids = list(user_ids)
+    removed = 0
+    for start in range(0, len(user_ids), batch_size):
+        deleted, _ = CohortMembership.objects.filter(
+            cohort=cohort, user_id__in=user_ids[start:start + batch_size]
+        ).delete()
+        removed += deleted
+    invalidate_members(*user_ids)
+    logger.debug(f"Removed {removed} users from cohort {cohort}")
+    return removed
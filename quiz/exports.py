@@ -0,0 +1,121 @@
+import csv
+import json
+from quiz.models import Question, QuestionOptions, UserQuestionAnswer, UserQuiz, unpack_answers
+
+ATTEMPT_FIELDS = (
+    ('attempt_id', 'id'),
+    ('user_id', 'user_id'),
+    ('username', 'user__username'),
+    ('level', 'quiz__level__slug'),
+    ('quiz', 'quiz__slug'),
+    ('quiz_title', 'quiz__title'),
+    ('start_time', 'start_time'),
+    ('end_time', 'end_time'),
+    ('is_completed', 'is_completed'),
+    # answered_count counts the questions served, skipped and timed out ones too
+    ('served', 'answered_count'),
+    ('correct', 'correct_count'),
+    ('total_questions', 'quiz__question_count'),
+    ('calculated_score', 'calculated_score'),
+)
+
+ANSWER_FIELDS = (
+    ('attempt_id', 'user_quiz_id'),
+    ('user_id', 'user_quiz__user_id'),
+    ('username', 'user_quiz__user__username'),
+    ('quiz', 'user_quiz__quiz__slug'),
+    ('question_id', 'question_id'),
+    ('question', 'question__question'),
+    ('option_id', 'answer_id'),
+    ('option', 'answer__option'),
+    ('is_correct', 'answer__answer'),
+    ('served_at', 'served_at'),
+    ('answered_at', 'answered_at'),
+)
+
+
+def _rows(queryset, fields, chunk_size):
+    names = [name for name, _ in fields]
+    # values_list + iterator streams through a server-side cursor where the
+    # backend has one, so memory stays flat however many rows there are
+    rows = queryset.values_list(*(lookup for _, lookup in fields))
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield dict(zip(names, row))
+
+
+def attempt_rows(user_quizzes=None, chunk_size=5000):
+    if user_quizzes is None:
+        user_quizzes = UserQuiz.objects.all()
+    return _rows(user_quizzes.order_by('id'), ATTEMPT_FIELDS, chunk_size)
+
+
+# Packed attempts are expanded this many at a time, one name lookup per batch
+PACKED_BATCH_SIZE = 500
+
+
+def answer_rows(user_quizzes=None, chunk_size=5000):
+    """Answers of in-flight attempts from their rows, then those of packed attempts."""
+    answers = UserQuestionAnswer.objects.all()
+    if user_quizzes is None:
+        user_quizzes = UserQuiz.objects.all()
+    else:
+        answers = answers.filter(user_quiz__in=user_quizzes)
+    yield from _rows(answers.order_by('user_quiz_id', 'id'), ANSWER_FIELDS, chunk_size)
+
+    attempts = user_quizzes.filter(answers_packed=True).order_by('id').values_list(
+        'id', 'user_id', 'user__username', 'quiz__slug', 'answer_log'
+    )
+    batch = []
+    for attempt in attempts.iterator(chunk_size=PACKED_BATCH_SIZE):
+        batch.append(attempt)
+        if len(batch) >= PACKED_BATCH_SIZE:
+            yield from _packed_rows(batch)
+            batch = []
+    yield from _packed_rows(batch)
+
+
+def _packed_rows(attempts):
+    records = [(attempt, unpack_answers(attempt[-1])) for attempt in attempts]
+    question_ids = {record.question_id for _, answers in records for record in answers}
+    option_ids = {record.option_id for _, answers in records for record in answers if record.option_id}
+    questions = dict(Question.objects.filter(id__in=question_ids).values_list('id', 'question'))
+    options = dict(QuestionOptions.objects.filter(id__in=option_ids).values_list('id', 'option'))
+
+    for (attempt_id, user_id, username, quiz, _), answers in records:
+        for record in answers:
+            yield {
+                'attempt_id': attempt_id,
+                'user_id': user_id,
+                'username': username,
+                'quiz': quiz,
+                'question_id': record.question_id,
+                'question': questions.get(record.question_id),
+                'option_id': record.option_id,
+                'option': options.get(record.option_id),
+                'is_correct': record.is_correct if record.option_id else None,
+                'served_at': record.served_at,
+                'answered_at': record.answered_at,
+            }
+
+
+class Echo:
+    """File-like object that hands back what is written, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _plain(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def write_rows(rows, fields, fmt):
+    names = [name for name, _ in fields]
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(names)
+        for row in rows:
+            yield writer.writerow([_plain(row[name]) for name in names])
+        return
+    for row in rows:
+        yield json.dumps({name: _plain(value) for name, value in row.items()}) + '\n'
@@ -0,0 +1,232 @@
+from collections import defaultdict
+from django.contrib.auth import get_user_model
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from quiz import live
+from quiz.cache import PRIMARY, bump_version, get_version, quiz_cache
+from quiz.models import ScoreRollup, UserQuiz, UserScore
+import logging
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 25
+TOP_SIZE = PAGE_SIZE
+TOP_CACHE_KEY = 'quiz:leaderboard:top:{version}'
+TOP_CACHE_TIMEOUT = 300
+
+# Rollup boards, see ScoreRollup. 'all' is both the global scope and all time
+ALL = 'all'
+PERIODS = (ALL, 'day', 'week')
+ROLLUP_BATCH_SIZE = 1000
+
+
+def ranked_scores():
+    # Walks userscore_rank_idx, so LIMIT/OFFSET never touches the rest of the table
+    return UserScore.objects.order_by('-total_score', 'id').values(
+        'id', 'user_id', 'user__username', 'total_score'
+    )
+
+
+def _entry(row, rank):
+    return {
+        "rank": rank,
+        "id": row['user_id'],
+        "user": row['user__username'],
+        "score": row['total_score'],
+        "score_id": row['id'],
+    }
+
+
+def _cached_top():
+    return quiz_cache().get(TOP_CACHE_KEY.format(version=get_version('leaderboard')))
+
+
+def top(n=TOP_SIZE):
+    # Read the version before the scores: a list built from scores a concurrent
+    # change has since replaced lands under a version nobody reads any more
+    key = TOP_CACHE_KEY.format(version=get_version('leaderboard'))
+    entries = quiz_cache().get(key)
+    if entries is None:
+        entries = [
+            _entry(row, rank)
+            for rank, row in enumerate(ranked_scores().using(PRIMARY)[:TOP_SIZE], start=1)
+        ]
+        quiz_cache().set(key, entries, TOP_CACHE_TIMEOUT)
+    return entries[:n]
+
+
+def rank_for(user_score):
+    if user_score is None:
+        return None
+    ahead = UserScore.objects.filter(total_score__gt=user_score.total_score).count()
+    ties = UserScore.objects.filter(
+        total_score=user_score.total_score, id__lt=user_score.id
+    ).count()
+    return ahead + ties + 1
+
+
+def page(number, per_page=PAGE_SIZE):
+    paginator = Paginator(ranked_scores(), per_page)
+    page_obj = paginator.get_page(number)
+    if page_obj.number == 1 and per_page <= TOP_SIZE:
+        entries = top(per_page)
+    else:
+        entries = [
+            _entry(row, rank)
+            for rank, row in enumerate(page_obj.object_list, start=page_obj.start_index())
+        ]
+    return page_obj, entries
+
+
+def score_changed(user_score, previous_score=None):
+    """Retire the cached top list after a committed score change, and push the
+    change to the live leaderboard streams.
+
+    The list is rebuilt from the index by the next reader instead of patched in
+    place, so concurrent changes in any process can't overwrite each other.
+    """
+    listening = live.listening()
+    # The streams are sent what moved, so they need the list from before
+    cached = _cached_top() if listening else None
+    bump_version('leaderboard')
+    logger.debug(f"Leaderboard top list invalidated by {user_score}")
+    if listening:
+        before = None
+        if cached is not None:
+            before = {entry['score_id']: (entry['rank'], entry['score']) for entry in cached}
+        live.publish(change_event(user_score, previous_score, before))
+
+
+def change_event(user_score, previous_score, before):
+    """What live streams need to follow a score change: the top list entries
+    that moved since before (the whole list if it wasn't cached) and the
+    changed score, which lets each stream move its viewer's rank without a query."""
+    entries = top()
+    event = {
+        'user_id': user_score.user_id,
+        'score_id': user_score.id,
+        'score': user_score.total_score,
+        'previous_score': previous_score,
+    }
+    if before is None:
+        event['top'] = entries
+    else:
+        listed = {entry['score_id'] for entry in entries}
+        event['changed'] = [
+            entry for entry in entries if before.get(entry['score_id']) != (entry['rank'], entry['score'])
+        ]
+        event['removed'] = [score_id for score_id in before if score_id not in listed]
+    return event
+
+
+def standing(user_id):
+    """The user's place on the all-time board, for the live stream, or None."""
+    user_score = UserScore.objects.filter(user_id=user_id).first()
+    if user_score is None:
+        return None
+    return {'rank': rank_for(user_score), 'score': user_score.total_score, 'score_id': user_score.id}
+
+
+def level_scope(level_id):
+    return f'level:{level_id}'
+
+
+def quiz_scope(quiz_id):
+    return f'quiz:{quiz_id}'
+
+
+def window_keys(moment):
+    """The windows a moment counts towards, one per period: all time, its day and its ISO week."""
+    day = timezone.localdate(moment)
+    year, week, _ = day.isocalendar()
+    return [ALL, f'day:{day.isoformat()}', f'week:{year}-W{week:02d}']
+
+
+def current_window(period):
+    return dict(zip(PERIODS, window_keys(timezone.now())))[period]
+
+
+def rollup_keys(quiz_id, level_id, moment):
+    return [
+        (scope, window)
+        for scope in (ALL, level_scope(level_id), quiz_scope(quiz_id))
+        for window in window_keys(moment)
+    ]
+
+
+def add_to_rollups(user_id, quiz_id, level_id, moment, score):
+    """Count a completed attempt on every board it belongs to.
+
+    Runs inside the transaction that claims the attempt's score, so each
+    attempt is added once; the existing rollups take one UPDATE and the
+    missing ones one INSERT.
+    """
+    keys = rollup_keys(quiz_id, level_id, moment)
+    match = Q()
+    for scope, window in keys:
+        match |= Q(scope=scope, window=window)
+    rollups = ScoreRollup.objects.filter(match, user_id=user_id)
+    existing = set(rollups.values_list('scope', 'window'))
+    if existing:
+        rollups.update(score=F('score') + score, attempts=F('attempts') + 1, modified=timezone.now())
+    ScoreRollup.objects.bulk_create([
+        ScoreRollup(user_id=user_id, scope=scope, window=window, score=score, attempts=1)
+        for scope, window in keys if (scope, window) not in existing
+    ])
+
+
+def ranked_rollups(scope, window):
+    # Walks scorerollup_rank_idx within the one board
+    return ScoreRollup.objects.filter(scope=scope, window=window).order_by('-score', 'id').values(
+        'id', 'user_id', 'user__username', total_score=F('score')
+    )
+
+
+def board_page(scope, window, number, per_page=PAGE_SIZE):
+    page_obj = Paginator(ranked_rollups(scope, window), per_page).get_page(number)
+    entries = [
+        _entry(row, rank)
+        for rank, row in enumerate(page_obj.object_list, start=page_obj.start_index())
+    ]
+    return page_obj, entries
+
+
+def rollup_rank_for(rollup):
+    if rollup is None:
+        return None
+    board = ScoreRollup.objects.filter(scope=rollup.scope, window=rollup.window)
+    ahead = board.filter(score__gt=rollup.score).count()
+    ties = board.filter(score=rollup.score, id__lt=rollup.id).count()
+    return ahead + ties + 1
+
+
+def rebuild_rollups(batch_size=ROLLUP_BATCH_SIZE):
+    """Recompute every user's rollups from their completed attempts, a batch
+    of users per transaction. Returns how many rollups were written."""
+    user_ids = list(get_user_model().objects.order_by('pk').values_list('pk', flat=True))
+    written = 0
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        with transaction.atomic():
+            # Deleting first takes SQLite's write lock before the read; attempts
+            # whose score task hasn't run yet are left for it to add
+            ScoreRollup.objects.filter(user_id__in=batch).delete()
+            attempts = UserQuiz.objects.filter(
+                user_id__in=batch, is_completed=True, is_score_added_total=True
+            ).values_list('user_id', 'quiz_id', 'quiz__level_id', Coalesce('end_time', 'modified'), 'calculated_score')
+            totals = defaultdict(lambda: [0, 0])
+            for user_id, quiz_id, level_id, moment, score in attempts:
+                for key in rollup_keys(quiz_id, level_id, moment):
+                    total = totals[user_id, key]
+                    total[0] += score
+                    total[1] += 1
+            ScoreRollup.objects.bulk_create([
+                ScoreRollup(user_id=user_id, scope=scope, window=window, score=score, attempts=count)
+                for (user_id, (scope, window)), (score, count) in totals.items()
+            ], batch_size=batch_size)
+        written += len(totals)
+        logger.debug(f"Rebuilt {written} rollups for {start + len(batch)} users")
+    return written
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+
+logger = logging.getLogger(__name__)
+
+# Events a stream may fall behind by before it gets a fresh snapshot instead
+QUEUE_SIZE = 64
+
+_subscribers = defaultdict(set)  # event loop -> its subscriptions
+_lock = threading.Lock()
+
+
+class Subscription:
+    """One stream's queue of events. It is only touched from the loop it was made on."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.overflowed = False
+
+    def deliver(self, event):
+        if self.queue.full():
+            # Deltas only make sense in order; a stalled client starts over instead
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.overflowed = True
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout):
+        """The next event, or raise TimeoutError after timeout seconds without one."""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def resync(self):
+        overflowed, self.overflowed = self.overflowed, False
+        return overflowed
+
+
+def subscribe():
+    subscription = Subscription(asyncio.get_running_loop())
+    with _lock:
+        _subscribers[subscription.loop].add(subscription)
+    return subscription
+
+
+def unsubscribe(subscription):
+    with _lock:
+        subscriptions = _subscribers.get(subscription.loop)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del _subscribers[subscription.loop]
+
+
+def listening():
+    return bool(_subscribers)
+
+
+def _fan_out(subscriptions, event):
+    for subscription in subscriptions:
+        subscription.deliver(event)
+
+
+def publish(event):
+    """Hand an event to every stream in this process. Safe from any thread.
+
+    One callback per event loop delivers to all of that loop's streams, so
+    thousands of idle streams cost a single wakeup.
+    """
+    with _lock:
+        targets = [(loop, list(subscriptions)) for loop, subscriptions in _subscribers.items()]
+    for loop, subscriptions in targets:
+        try:
+            loop.call_soon_threadsafe(_fan_out, subscriptions, event)
+        except RuntimeError:
+            # The loop closed under its streams, e.g. a worker shutting down
+            logger.debug(f"Dropped {len(subscriptions)} subscriptions of a closed event loop")
+            with _lock:
+                _subscribers.pop(loop, None)
+
+
+def available(request):
+    # Under WSGI an open stream pins a worker thread and never sends a byte
+    return isinstance(request, ASGIRequest)
+
+
+def keepalive_seconds():
+    return getattr(settings, 'QUIZ_LIVE_KEEPALIVE_SECONDS', 15)
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+def keepalive():
+    # A comment line; it keeps proxies from closing an idle stream
+    return ": keepalive\n\n"
@@ -0,0 +1,53 @@
+import os
+import statistics
+import tempfile
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import override_settings
+
+BENCH_CACHE_ALIAS = 'quiz_bench'
+
+
+@contextmanager
+def bench_database(alias=DEFAULT_DB_ALIAS):
+    """Run a benchmark against a freshly migrated throwaway copy of the schema.
+
+    SQLite gets a file database instead of the in-memory default, so that
+    worker threads share it through their own connections. The quiz caches
+    move to a private in-memory cache meanwhile: their keys don't name the
+    database, and the throwaway ids overlap the real ones.
+    """
+    connection = connections[alias]
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+        test_settings['NAME'] = os.path.join(tempfile.gettempdir(), 'quiz_bench.sqlite3')
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False
+    )
+    isolated_caches = override_settings(
+        CACHES={**settings.CACHES, BENCH_CACHE_ALIAS: {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': BENCH_CACHE_ALIAS,
+        }},
+        QUIZ_CACHE_ALIAS=BENCH_CACHE_ALIAS,
+        QUIZ_VERSION_CACHE_ALIAS=BENCH_CACHE_ALIAS,
+    )
+    isolated_caches.enable()
+    try:
+        yield connection
+    finally:
+        # A locmem cache lives as long as the process, the next run starts empty
+        caches[BENCH_CACHE_ALIAS].clear()
+        isolated_caches.disable()
+        connections.close_all()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[pct - 1]
@@ -0,0 +1,20 @@
+import time
+from django.core.management.base import BaseCommand
+from quiz.analytics import ANALYSIS_BATCH_SIZE, analyze_items, reset_items
+
+
+class Command(BaseCommand):
+    help = "Fold completed attempts into the question and option stats; only new attempts unless --rebuild"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=ANALYSIS_BATCH_SIZE)
+        parser.add_argument('--rebuild', action='store_true', help="Recompute the stats from every attempt")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['rebuild']:
+            reset_items()
+        analyzed = analyze_items(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Analyzed {analyzed} attempts in {time.perf_counter() - started:.2f}s"
+        ))
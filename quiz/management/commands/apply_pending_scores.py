@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from quiz.models import UserQuiz
+from quiz.tasks import apply_quiz_score
+
+
+class Command(BaseCommand):
+    help = "Add completed quizzes whose score never reached the user's total (e.g. after a crash)"
+
+    def handle(self, *args, **options):
+        pending = UserQuiz.objects.filter(
+            is_completed=True, is_score_added_total=False
+        ).values_list('id', flat=True)
+
+        applied = 0
+        for user_quiz_id in pending.iterator():
+            apply_quiz_score(user_quiz_id)
+            applied += 1
+        self.stdout.write(self.style.SUCCESS(f"Applied {applied} pending quiz scores"))
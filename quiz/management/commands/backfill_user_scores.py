@@ -0,0 +1,17 @@
+import time
+from django.core.management.base import BaseCommand
+from quiz.services import backfill_user_scores
+
+
+class Command(BaseCommand):
+    help = "Create a UserScore for every user that has none"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        created = backfill_user_scores(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {created} user scores in {time.perf_counter() - started:.2f}s"
+        ))
@@ -0,0 +1,107 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.utils import timezone
+from quiz.cache import get_bundle, invalidate_quiz
+from quiz.models import Level, Question, QuestionOptions, Quiz, UserQuiz
+from ._bench import bench_database, percentile
+
+User = get_user_model()
+
+# Connection pragmas compared on SQLite; 'rollback' is SQLite's own default
+SQLITE_PROFILES = {
+    'rollback': {'journal_mode': 'delete', 'synchronous': 'full', 'busy_timeout': 5000},
+    'wal': {'journal_mode': 'wal', 'synchronous': 'normal', 'busy_timeout': 20000},
+}
+
+
+class Command(BaseCommand):
+    help = "Measure concurrent answer-write throughput for each database profile"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=64)
+        parser.add_argument('--questions', type=int, default=20)
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument(
+            '--profiles', default=','.join(SQLITE_PROFILES),
+            help="Comma separated SQLite profiles to compare (ignored on other databases)",
+        )
+
+    def handle(self, *args, **options):
+        settings_dict = connection.settings_dict
+        if connection.vendor != 'sqlite':
+            self.run_profile(connection.vendor, options)
+            return
+
+        original = settings_dict.get('PRAGMAS')
+        try:
+            for name in options['profiles'].split(','):
+                if name not in SQLITE_PROFILES:
+                    raise CommandError(f"Unknown profile {name}, choose from {', '.join(SQLITE_PROFILES)}")
+                # Worker threads open their connections from this same settings dict
+                settings_dict['PRAGMAS'] = SQLITE_PROFILES[name]
+                self.run_profile(f"sqlite/{name}", options)
+        finally:
+            settings_dict['PRAGMAS'] = original
+
+    def run_profile(self, name, options):
+        # bench_database gives the bundle a private cache; the seeded questions
+        # skipped the signals, so their quiz's version is bumped by hand
+        with bench_database():
+            quiz, players = self.seed(options)
+            invalidate_quiz(quiz.id)
+            bundle = get_bundle(quiz)
+            questions = list(bundle.questions.values())
+
+            def play(user_quiz):
+                latencies, errors = [], 0
+                try:
+                    for question in questions:
+                        started = time.perf_counter()
+                        try:
+                            user_quiz.record_served(question)
+                            user_quiz.record_answer(question, question.options[0])
+                        except OperationalError:
+                            errors += 1
+                        latencies.append(time.perf_counter() - started)
+                finally:
+                    connection.close()
+                return latencies, errors
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                results = list(pool.map(play, players))
+            elapsed = time.perf_counter() - started
+
+        latencies = sorted(ms * 1000 for player, _ in results for ms in player)
+        errors = sum(player_errors for _, player_errors in results)
+        answered = len(latencies) - errors
+        self.stdout.write(
+            f"{name:<16} {answered} answers in {elapsed:.2f}s = {answered / elapsed:.0f} answers/s"
+            f" (p50 {percentile(latencies, 50):.1f}ms, p99 {percentile(latencies, 99):.1f}ms,"
+            f" {errors} failed as database busy)"
+        )
+
+    def seed(self, options):
+        level = Level.objects.create(name="Bench level", slug="bench-level", description="")
+        quiz = Quiz.objects.create(
+            title="Bench quiz", slug="bench-quiz", description="", level=level,
+            published=True, end_date=timezone.now() + timedelta(days=1),
+        )
+        questions = Question.objects.bulk_create(
+            Question(quiz=quiz, question=f"Question {i}") for i in range(options['questions'])
+        )
+        QuestionOptions.objects.bulk_create(
+            QuestionOptions(question=question, option=f"Option {i}", answer=(i == 0))
+            for question in questions for i in range(4)
+        )
+        users = User.objects.bulk_create(
+            User(username=f"writer-{i}") for i in range(options['players'])
+        )
+        players = UserQuiz.objects.bulk_create(
+            UserQuiz(user=user, quiz=quiz, start_time=timezone.now()) for user in users
+        )
+        return quiz, players
@@ -0,0 +1,199 @@
+import json
+import random
+import re
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from quiz import tasks
+from quiz.cache import invalidate_catalog, invalidate_quiz
+from quiz.entitlements import enroll
+from quiz.models import Cohort, Level, Question, QuestionOptions, Quiz, UserScore
+from ._bench import bench_database, percentile
+
+User = get_user_model()
+
+QUESTION_RE = re.compile(r'name="question" value="(\d+)"')
+OPTION_RE = re.compile(r"submitForm\('(\d+)'\)")
+
+
+class Command(BaseCommand):
+    help = "Seed a throwaway database and drive concurrent players through the quiz flow"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--levels', type=int, default=2)
+        parser.add_argument('--quizzes', type=int, default=5, help="Quizzes per level")
+        parser.add_argument('--questions', type=int, default=10, help="Questions per quiz")
+        parser.add_argument('--options', type=int, default=4, help="Options per question")
+        parser.add_argument('--plays', type=int, default=2, help="Quizzes played by each user")
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--api', action='store_true', help="Answer through the JSON API instead of the pages")
+        parser.add_argument('--json', dest='json_path', help="Write the report as JSON to this file ('-' for stdout)")
+
+    def handle(self, *args, **options):
+        with bench_database() as db:
+            seeded_at = time.perf_counter()
+            users, quiz_slugs = self.seed(options)
+            seed_time = time.perf_counter() - seeded_at
+
+            samples = defaultdict(list)
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+                for player_samples in pool.map(
+                    lambda user: self.play(user, random.sample(quiz_slugs, options['plays']), options['api']),
+                    users,
+                ):
+                    for endpoint, measured in player_samples.items():
+                        samples[endpoint].extend(measured)
+            elapsed = time.perf_counter() - started
+            tasks.drain()
+            vendor = db.vendor
+
+        report = self.report(samples, elapsed, options, vendor, seed_time)
+        if options['json_path'] == '-':
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(report, f, indent=2)
+        self.print_report(report)
+
+    def seed(self, options):
+        users = User.objects.bulk_create(
+            User(username=f"player-{i}") for i in range(options['users'])
+        )
+        UserScore.objects.bulk_create(UserScore(user=user) for user in users)
+
+        end_date = timezone.now() + timedelta(days=30)
+        quizzes = []
+        for level_number in range(options['levels']):
+            level = Level.objects.create(
+                name=f"Bench level {level_number}", slug=f"bench-level-{level_number}",
+                description="",
+            )
+            quizzes += Quiz.objects.bulk_create(
+                Quiz(
+                    title=f"Bench quiz {level_number}-{i}", slug=f"bench-quiz-{level_number}-{i}",
+                    description="", level=level, published=True,
+                    published_at=timezone.now(), end_date=end_date,
+                    question_count=options['questions'],
+                )
+                for i in range(options['quizzes'])
+            )
+
+        questions = Question.objects.bulk_create(
+            Question(quiz=quiz, question=f"Question {i} of {quiz.slug}", time=30)
+            for quiz in quizzes for i in range(options['questions'])
+        )
+        QuestionOptions.objects.bulk_create(
+            QuestionOptions(question=question, option=f"Option {i}", answer=(i == 0))
+            for question in questions for i in range(options['options'])
+        )
+        cohort = Cohort.objects.create(name="Bench players", slug="bench-players")
+        cohort.quizzes.set(quizzes)
+        enroll(cohort, [user.id for user in users])
+        # bulk_create skips the signals that would expire these
+        invalidate_catalog(*{quiz.level.slug for quiz in quizzes})
+        for quiz in quizzes:
+            invalidate_quiz(quiz.id)
+        return users, [quiz.slug for quiz in quizzes]
+
+    def play(self, user, quiz_slugs, api=False):
+        client = Client()
+        client.force_login(user)
+        samples = defaultdict(list)
+
+        def request(endpoint, method, url, data=None):
+            with CaptureQueriesContext(connection) as queries:
+                began = time.perf_counter()
+                response = getattr(client, method)(url, data or {})
+                took = time.perf_counter() - began
+            samples[f"{endpoint} {method.upper()}"].append((took, len(queries)))
+            return response
+
+        try:
+            for slug in quiz_slugs:
+                request('quiz_detail', 'get', reverse('quiz:quiz_detail', args=[slug]))
+                if api:
+                    self.play_api(request, slug)
+                    continue
+                request('quiz_detail', 'post', reverse('quiz:quiz_detail', args=[slug]))
+                question_url = reverse('quiz:quiz_question', args=[slug])
+                response = request('quiz_question', 'get', question_url)
+                while response.status_code == 200:
+                    page = response.content.decode()
+                    question = QUESTION_RE.search(page)
+                    choices = OPTION_RE.findall(page)
+                    if not question or not choices:
+                        break
+                    response = request('quiz_question', 'post', question_url, {
+                        'question': question.group(1), 'answer': random.choice(choices),
+                    })
+                request('quiz_complete', 'get', reverse('quiz:quiz_complete', args=[slug]))
+                request('leaderboard', 'get', reverse('quiz:leaderboard'))
+        finally:
+            connection.close()
+        return samples
+
+    def play_api(self, request, slug):
+        data = request('api_start', 'post', reverse('quiz:api_start', args=[slug])).json()
+        answer_url = reverse('quiz:api_answer', args=[slug])
+        while data.get('question'):
+            question = data['question']
+            data = request('api_answer', 'post', answer_url, {
+                'question': question['id'], 'option': random.choice(question['options'])[0],
+            }).json()
+        request('api_result', 'get', reverse('quiz:api_result', args=[slug]))
+        request('leaderboard', 'get', reverse('quiz:leaderboard'))
+
+    def report(self, samples, elapsed, options, vendor, seed_time):
+        endpoints = {}
+        for endpoint, measured in sorted(samples.items()):
+            latencies = sorted(took * 1000 for took, _ in measured)
+            queries = [count for _, count in measured]
+            endpoints[endpoint] = {
+                'requests': len(measured),
+                'p50_ms': round(percentile(latencies, 50), 2),
+                'p95_ms': round(percentile(latencies, 95), 2),
+                'p99_ms': round(percentile(latencies, 99), 2),
+                'queries_mean': round(sum(queries) / len(queries), 2),
+                'queries_max': max(queries),
+                'throughput_rps': round(len(measured) / elapsed, 2),
+            }
+        total = sum(endpoint['requests'] for endpoint in endpoints.values())
+        return {
+            'database': vendor,
+            'options': {
+                key: options[key] for key in (
+                    'users', 'levels', 'quizzes', 'questions', 'options', 'plays', 'concurrency', 'api'
+                )
+            },
+            'seed_seconds': round(seed_time, 2),
+            'elapsed_seconds': round(elapsed, 2),
+            'requests': total,
+            'throughput_rps': round(total / elapsed, 2),
+            'endpoints': endpoints,
+        }
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"{report['requests']} requests in {report['elapsed_seconds']}s on {report['database']}"
+            f" ({report['throughput_rps']} req/s)"
+        )
+        self.stdout.write(
+            f"{'endpoint':<22}{'requests':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+            f"{'queries':>9}{'req/s':>9}"
+        )
+        for endpoint, stats in report['endpoints'].items():
+            self.stdout.write(
+                f"{endpoint:<22}{stats['requests']:>9}{stats['p50_ms']:>9}{stats['p95_ms']:>9}"
+                f"{stats['p99_ms']:>9}{stats['queries_mean']:>9}{stats['throughput_rps']:>9}"
+            )
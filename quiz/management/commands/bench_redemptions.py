@@ -0,0 +1,91 @@
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from quiz.models import Reward, UserReward, UserScore
+from quiz.services import RedemptionError, redeem_reward
+from ._bench import bench_database
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Fire concurrent reward redemptions at a throwaway database and check nothing is oversold"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--redemptions', type=int, default=5000)
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument('--stock', type=int, default=1000)
+        parser.add_argument('--cost', type=int, default=10)
+        parser.add_argument('--points', type=int, default=100, help="Starting points per user")
+
+    def handle(self, *args, **options):
+        with bench_database() as db:
+            self.stdout.write(f"Benchmarking redemptions on {db.vendor} ({db.settings_dict['NAME']})")
+            users, reward = self.seed(options)
+            outcomes, elapsed = self.fire(users, reward, options)
+            self.verify(users, reward, outcomes, options)
+
+        succeeded = outcomes['redeemed']
+        self.stdout.write(
+            f"{options['redemptions']} attempts in {elapsed:.2f}s "
+            f"({options['redemptions'] / elapsed:.0f} attempts/s, {succeeded / elapsed:.0f} redemptions/s)"
+        )
+        self.stdout.write(", ".join(f"{name}: {count}" for name, count in sorted(outcomes.items())))
+        self.stdout.write(self.style.SUCCESS("No oversold stock and no overspent points"))
+
+    def seed(self, options):
+        users = User.objects.bulk_create(
+            User(username=f"bench-{i}") for i in range(options['users'])
+        )
+        UserScore.objects.bulk_create(
+            UserScore(user=user, total_score=options['points']) for user in users
+        )
+        reward = Reward.objects.create(
+            name="Bench reward", description="",
+            exchanged_points=options['cost'], quantity=options['stock'],
+        )
+        return users, reward
+
+    def fire(self, users, reward, options):
+        def attempt(user):
+            try:
+                redeem_reward(user, reward)
+                return 'redeemed'
+            except RedemptionError as e:
+                return 'out of stock' if 'available' in str(e) else 'not enough points'
+            except OperationalError:
+                return 'database busy'
+            finally:
+                connection.close()
+
+        picks = [random.choice(users) for _ in range(options['redemptions'])]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            outcomes = Counter(pool.map(attempt, picks))
+        return outcomes, time.perf_counter() - started
+
+    def verify(self, users, reward, outcomes, options):
+        reward.refresh_from_db()
+        redeemed = UserReward.objects.filter(reward=reward).count()
+        spent = options['points'] * len(users) - UserScore.objects.aggregate(
+            total=Sum('total_score'))['total']
+
+        problems = []
+        if reward.quantity < 0:
+            problems.append(f"stock went negative ({reward.quantity})")
+        if reward.quantity != options['stock'] - redeemed:
+            problems.append(f"stock {reward.quantity} != {options['stock']} - {redeemed} redeemed")
+        if redeemed != outcomes['redeemed']:
+            problems.append(f"{redeemed} UserReward rows for {outcomes['redeemed']} redemptions")
+        if spent != redeemed * options['cost']:
+            problems.append(f"{spent} points spent for {redeemed} redemptions")
+        if UserScore.objects.filter(total_score__lt=0).exists():
+            problems.append("some users spent more points than they had")
+        if problems:
+            raise CommandError("; ".join(problems))
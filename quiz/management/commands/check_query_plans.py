@@ -0,0 +1,85 @@
+import re
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from quiz import leaderboard
+from quiz.entitlements import entitled_quiz_ids
+from quiz.models import Quiz, UserQuestionAnswer, UserQuiz, UserScore
+
+# Any scan that walks a whole table rather than an index range
+FULL_SCAN = {
+    'sqlite': re.compile(r'\bSCAN (?!.*\bUSING (COVERING )?INDEX\b)(\S+)'),
+    'postgresql': re.compile(r'\bSeq Scan on (\S+)'),
+}
+
+
+def hot_queries():
+    """The query shapes behind views.py, quiz.cache and the quiz templatetags, with placeholder ids."""
+    user_id, quiz_id, level_id, user_quiz_id = 1, 1, 1, 1
+    # A level-wide grant covers most quizzes; on a large access set the planner
+    # walks quiz_open_end_date_idx instead of looking up and sorting every id
+    access = range(quiz_id, quiz_id + 500)
+    open_quizzes = Quiz.objects.filter(
+        id__in=access, published=True, end_date__gte=timezone.now()
+    ).order_by('end_date')
+    return {
+        'entitlements.entitled_quiz_ids': entitled_quiz_ids(user_id),
+        'QuizMixin.get_queryset': open_quizzes,
+        'cache.catalog_quizzes': Quiz.objects.filter(
+            id__in=access, published=True, end_date__isnull=False
+        ).order_by('end_date'),
+        'QuizMixin.get_user_quiz_by_slug': UserQuiz.objects.select_related('quiz').filter(
+            user=user_id, quiz__in=open_quizzes, quiz__slug='quiz',
+        ),
+        'QuizMixin.get_user_quizzes': UserQuiz.objects.filter(
+            user=user_id, quiz__published=True
+        ).select_related('quiz', 'user'),
+        'LevelQuizView quizzes': Quiz.objects.filter(level=level_id, published=True),
+        'templatetags get_user_quiz': UserQuiz.objects.filter(quiz=quiz_id, user=user_id),
+        'UserQuiz correct answers': UserQuestionAnswer.objects.filter(
+            user_quiz=user_quiz_id, answer__answer=True
+        ),
+        'UserQuiz.record_answer': UserQuestionAnswer.objects.filter(
+            user_quiz=user_quiz_id, question_id=1, answer__isnull=True
+        ),
+        'leaderboard page': leaderboard.ranked_scores()[:leaderboard.PAGE_SIZE],
+        'leaderboard rank': UserScore.objects.filter(
+            Q(total_score__gt=100) | Q(total_score=100, id__lt=1)
+        ),
+        'apply_pending_scores': UserQuiz.objects.filter(
+            is_completed=True, is_score_added_total=False
+        ).values_list('id', flat=True),
+    }
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the hot queries and fail if any of them scans a whole table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plans', action='store_true', help="Print every query plan")
+
+    def handle(self, *args, **options):
+        pattern = FULL_SCAN.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f"Don't know how to read {connection.vendor} query plans")
+
+        failures = []
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Tiny tables make sequential scans look cheap; ask what it would use at scale
+                cursor.execute('SET enable_seqscan = off')
+            for name, queryset in hot_queries().items():
+                plan = queryset.explain()
+                scans = pattern.findall(plan)
+                tables = [scan[-1] if isinstance(scan, tuple) else scan for scan in scans]
+                if options['plans'] or tables:
+                    self.stdout.write(f"{name}:\n{plan}\n")
+                if tables:
+                    failures.append(f"{name} scans {', '.join(tables)}")
+            if connection.vendor == 'postgresql':
+                cursor.execute('RESET enable_seqscan')
+
+        if failures:
+            raise CommandError("Full table scans in hot queries:\n  " + "\n  ".join(failures))
+        self.stdout.write(self.style.SUCCESS(f"All {len(hot_queries())} hot queries use indexes"))
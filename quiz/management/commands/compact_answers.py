@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from quiz.models import UserQuiz
+from quiz.tasks import compact_attempt
+
+
+class Command(BaseCommand):
+    help = "Pack the answer rows of completed attempts into UserQuiz.answer_log"
+
+    def handle(self, *args, **options):
+        pending = UserQuiz.objects.filter(
+            is_completed=True, answers_packed=False
+        ).values_list('id', flat=True)
+
+        packed = 0
+        for user_quiz_id in pending.iterator():
+            packed += compact_attempt(user_quiz_id)
+        self.stdout.write(self.style.SUCCESS(f"Packed the answers of {packed} completed attempts"))
@@ -0,0 +1,59 @@
+import sys
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from quiz import entitlements
+from quiz.models import Cohort
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Bulk add (or remove) users to a cohort, by username, one per line"
+
+    def add_arguments(self, parser):
+        parser.add_argument('cohort', help="Cohort slug")
+        parser.add_argument('path', nargs='?', default='-', help="File of usernames, or '-' for stdin")
+        parser.add_argument('--all-users', action='store_true', help="Enroll every active user")
+        parser.add_argument('--remove', action='store_true', help="Remove the users instead")
+        parser.add_argument('--batch-size', type=int, default=entitlements.ENROLL_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            cohort = Cohort.objects.get(slug=options['cohort'])
+        except Cohort.DoesNotExist:
+            raise CommandError(f"No cohort with slug {options['cohort']!r}")
+
+        if options['all_users']:
+            user_ids = list(User.objects.filter(is_active=True).values_list('id', flat=True))
+            missing = []
+        else:
+            user_ids, missing = self.lookup(self.read_usernames(options['path']), options['batch_size'])
+
+        if options['remove']:
+            removed = entitlements.unenroll(cohort, user_ids, options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Removed {removed} users from {cohort}"))
+        else:
+            entitlements.enroll(cohort, user_ids, options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{cohort} has {cohort.member_count} members after enrolling {len(user_ids)} users"
+            ))
+        for username in missing[:50]:
+            self.stderr.write(f"unknown user: {username}")
+        if len(missing) > 50:
+            self.stderr.write(f"... and {len(missing) - 50} more unknown users")
+
+    def read_usernames(self, path):
+        try:
+            stream = sys.stdin if path == '-' else open(path, encoding='utf-8')
+        except OSError as e:
+            raise CommandError(e)
+        with stream:
+            return [line.strip() for line in stream if line.strip()]
+
+    def lookup(self, usernames, batch_size):
+        found = {}
+        for start in range(0, len(usernames), batch_size):
+            found.update(User.objects.filter(
+                username__in=usernames[start:start + batch_size]
+            ).values_list('username', 'id'))
+        return list(found.values()), [username for username in usernames if username not in found]
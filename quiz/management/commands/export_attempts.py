@@ -0,0 +1,47 @@
+import sys
+import time
+from django.core.management.base import BaseCommand
+from quiz import exports
+from quiz.models import UserQuiz
+
+
+class Command(BaseCommand):
+    help = "Stream quiz attempts, or their answers, out as CSV or JSON Lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--answers', action='store_true', help="One row per answer instead of per attempt")
+        parser.add_argument('--quiz', action='append', dest='quizzes', help="Quiz slug, can be repeated (default: all)")
+        parser.add_argument('--completed', action='store_true', help="Only completed attempts")
+        parser.add_argument('--format', choices=('csv', 'jsonl'), default='csv')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('-o', '--output', default='-', help="File to write, or '-' for stdout")
+
+    def handle(self, *args, **options):
+        user_quizzes = UserQuiz.objects.all()
+        if options['quizzes']:
+            user_quizzes = user_quizzes.filter(quiz__slug__in=options['quizzes'])
+        if options['completed']:
+            user_quizzes = user_quizzes.filter(is_completed=True)
+
+        if options['answers']:
+            rows = exports.answer_rows(user_quizzes, options['chunk_size'])
+            fields = exports.ANSWER_FIELDS
+        else:
+            rows = exports.attempt_rows(user_quizzes, options['chunk_size'])
+            fields = exports.ATTEMPT_FIELDS
+
+        started = time.perf_counter()
+        written = 0
+        out = sys.stdout if options['output'] == '-' else open(
+            options['output'], 'w', newline='', encoding='utf-8')
+        try:
+            for chunk in exports.write_rows(rows, fields, options['format']):
+                out.write(chunk)
+                written += 1
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        if out is not sys.stdout:
+            self.stderr.write(self.style.SUCCESS(
+                f"Exported {written} lines to {options['output']} in {time.perf_counter() - started:.2f}s"
+            ))
@@ -0,0 +1,32 @@
+import sys
+from django.core.management.base import BaseCommand
+from quiz.bank import detect_format, export_rows, write_rows
+from quiz.models import Quiz
+
+
+class Command(BaseCommand):
+    help = "Stream quizzes' questions and options out as JSON Lines or CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', action='append', dest='quizzes', help="Quiz slug, can be repeated (default: all)")
+        parser.add_argument('--level', help="Only quizzes of this level slug")
+        parser.add_argument('-o', '--output', default='-', help="File to write, or '-' for stdout")
+        parser.add_argument('--format', choices=('jsonl', 'csv'), help="Defaults to the file extension")
+
+    def handle(self, *args, **options):
+        quizzes = Quiz.objects.all()
+        if options['quizzes']:
+            quizzes = quizzes.filter(slug__in=options['quizzes'])
+        if options['level']:
+            quizzes = quizzes.filter(level__slug=options['level'])
+        fmt = options['format'] or detect_format(options['output'])
+
+        chunks = write_rows(export_rows(quizzes), fmt)
+        if options['output'] == '-':
+            for chunk in chunks:
+                sys.stdout.write(chunk)
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f"Exported to {options['output']}"))
@@ -0,0 +1,32 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from quiz.bank import BankImporter, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = "Stream a JSON Lines or CSV question bank into levels, quizzes, questions and options"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for stdin")
+        parser.add_argument('--format', choices=('jsonl', 'csv'), help="Defaults to the file extension")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or detect_format(options['path'])
+        if options['path'] == '-':
+            importer = BankImporter(options['batch_size']).run(read_rows(sys.stdin, fmt))
+        else:
+            try:
+                with open(options['path'], newline='', encoding='utf-8') as stream:
+                    importer = BankImporter(options['batch_size']).run(read_rows(stream, fmt))
+            except OSError as e:
+                raise CommandError(e)
+
+        for line_number, error in importer.errors[:50]:
+            self.stderr.write(f"line {line_number}: {error}")
+        if len(importer.errors) > 50:
+            self.stderr.write(f"... and {len(importer.errors) - 50} more invalid rows")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {importer.imported} questions in {importer.seconds:.2f}s"
+            f" ({importer.rows_per_second:.0f} rows/s), skipped {len(importer.errors)} invalid rows"
+        ))
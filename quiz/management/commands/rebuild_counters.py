@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from quiz.models import Quiz, Question, UserQuiz, UserQuestionAnswer
+
+
+def count_of(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).values(field)
+        .annotate(total=Count('id')).values('total')
+    ), 0)
+
+
+def question_count():
+    return count_of(Question.objects.all(), 'quiz')
+
+
+def answered_count():
+    return count_of(UserQuestionAnswer.objects.all(), 'user_quiz')
+
+
+def correct_count():
+    return count_of(UserQuestionAnswer.objects.filter(answer__answer=True), 'user_quiz')
+
+
+class Command(BaseCommand):
+    help = "Rebuild (or verify) the question/answer counters on Quiz and UserQuiz"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help="Only report counters that drifted, exit non-zero if any did",
+        )
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            return self.verify()
+
+        with transaction.atomic():
+            quizzes = Quiz.objects.update(question_count=question_count())
+            # Packed attempts have no answer rows left to count
+            user_quizzes = UserQuiz.objects.filter(answers_packed=False).update(
+                answered_count=answered_count(), correct_count=correct_count()
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt counters for {quizzes} quizzes and {user_quizzes} user quizzes"
+        ))
+
+    def verify(self):
+        drifted_quizzes = Quiz.objects.annotate(actual=question_count()).exclude(
+            question_count=F('actual')
+        ).values_list('slug', 'question_count', 'actual')
+        drifted_user_quizzes = UserQuiz.objects.filter(answers_packed=False).annotate(
+            actual_answered=answered_count(), actual_correct=correct_count()
+        ).filter(
+            ~Q(answered_count=F('actual_answered')) | ~Q(correct_count=F('actual_correct'))
+        ).values_list('id', 'answered_count', 'actual_answered', 'correct_count', 'actual_correct')
+
+        drifted = 0
+        for slug, stored, actual in drifted_quizzes.iterator():
+            drifted += 1
+            self.stdout.write(f"Quiz {slug}: question_count {stored} != {actual}")
+        for pk, answered, actual_answered, correct, actual_correct in drifted_user_quizzes.iterator():
+            drifted += 1
+            self.stdout.write(
+                f"UserQuiz {pk}: answered_count {answered} != {actual_answered}"
+                f" or correct_count {correct} != {actual_correct}"
+            )
+        if drifted:
+            raise CommandError(f"{drifted} counters drifted, run rebuild_counters to fix them")
+        self.stdout.write(self.style.SUCCESS("All counters are consistent"))
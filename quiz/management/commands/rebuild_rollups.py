@@ -0,0 +1,17 @@
+import time
+from django.core.management.base import BaseCommand
+from quiz.leaderboard import ROLLUP_BATCH_SIZE, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the level, quiz, daily and weekly leaderboard rollups from completed attempts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=ROLLUP_BATCH_SIZE, help="Users per transaction")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = rebuild_rollups(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} rollups in {time.perf_counter() - started:.2f}s"
+        ))
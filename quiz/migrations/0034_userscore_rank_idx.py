@@ -0,0 +1,19 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0033_reward_quantity_alter_reward_exchanged_points'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userscore',
+            index=models.Index(fields=['-total_score', 'id'], name='userscore_rank_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:07
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).values(field)
+        .annotate(total=Count('id')).values('total')
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Quiz = apps.get_model('quiz', 'Quiz')
+    Question = apps.get_model('quiz', 'Question')
+    UserQuiz = apps.get_model('quiz', 'UserQuiz')
+    UserQuestionAnswer = apps.get_model('quiz', 'UserQuestionAnswer')
+
+    Quiz.objects.update(question_count=count_of(Question.objects.all(), 'quiz'))
+    UserQuiz.objects.update(
+        answered_count=count_of(UserQuestionAnswer.objects.all(), 'user_quiz'),
+        correct_count=count_of(
+            UserQuestionAnswer.objects.filter(answer__answer=True), 'user_quiz'
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0034_userscore_rank_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='question_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userquiz',
+            name='answered_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userquiz',
+            name='correct_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0035_quiz_question_count_userquiz_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userquiz',
+            name='question_order',
+            field=models.BinaryField(default=bytes),
+        ),
+    ]
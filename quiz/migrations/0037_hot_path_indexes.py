@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0036_userquiz_question_order'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(condition=models.Q(('published', True)), fields=['end_date'], name='quiz_open_end_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['level', 'published'], name='quiz_level_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userquestionanswer',
+            index=models.Index(fields=['user_quiz', 'answer'], name='uqa_user_quiz_answer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userquiz',
+            index=models.Index(condition=models.Q(('is_completed', True), ('is_score_added_total', False)), fields=['id'], name='userquiz_pending_score_idx'),
+        ),
+    ]
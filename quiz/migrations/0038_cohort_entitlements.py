@@ -0,0 +1,91 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def move_user_grants(apps, schema_editor):
+    # Users with the same quiz grants end up in one shared cohort. Only
+    # Quiz.users gated access; Level.users never did, so it grants nothing here
+    Quiz = apps.get_model('quiz', 'Quiz')
+    Cohort = apps.get_model('quiz', 'Cohort')
+    CohortMembership = apps.get_model('quiz', 'CohortMembership')
+
+    grants = {}
+    for user_id, quiz_id in Quiz.users.through.objects.values_list('user_id', 'quiz_id').iterator():
+        grants.setdefault(user_id, set()).add(quiz_id)
+
+    groups = {}
+    for user_id, quiz_ids in grants.items():
+        groups.setdefault(frozenset(quiz_ids), []).append(user_id)
+
+    for number, (quiz_ids, user_ids) in enumerate(groups.items(), start=1):
+        cohort = Cohort.objects.create(
+            name=f"Migrated access {number}", slug=f"migrated-access-{number}",
+            description="Created from the per-user quiz access lists",
+        )
+        cohort.quizzes.set(quiz_ids)
+        CohortMembership.objects.bulk_create(
+            (CohortMembership(cohort=cohort, user_id=user_id) for user_id in user_ids),
+            batch_size=5000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0037_hot_path_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Cohort',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('slug', models.SlugField(unique=True)),
+                ('description', models.TextField(blank=True)),
+                ('levels', models.ManyToManyField(blank=True, related_name='cohorts', to='quiz.level')),
+                ('quizzes', models.ManyToManyField(blank=True, related_name='cohorts', to='quiz.quiz')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='CohortMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('cohort', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='quiz.cohort')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='cohort',
+            name='members',
+            field=models.ManyToManyField(related_name='cohorts', through='quiz.CohortMembership', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='cohortmembership',
+            index=models.Index(fields=['user', 'cohort'], name='cohort_membership_user_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='cohortmembership',
+            constraint=models.UniqueConstraint(fields=('cohort', 'user'), name='cohort_membership_unique'),
+        ),
+        migrations.RunPython(move_user_grants, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='level',
+            name='users',
+        ),
+        migrations.RemoveField(
+            model_name='quiz',
+            name='users',
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:28
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_ledger(apps, schema_editor):
+    # Rows were created when served and touched when answered
+    UserQuestionAnswer = apps.get_model('quiz', 'UserQuestionAnswer')
+    UserQuestionAnswer.objects.update(served_at=F('created'))
+    UserQuestionAnswer.objects.filter(answer__isnull=False).update(answered_at=F('modified'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0038_cohort_entitlements'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userquestionanswer',
+            name='answered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userquestionanswer',
+            name='served_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(fill_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0039_answer_timing_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userquiz',
+            name='answer_log',
+            field=models.BinaryField(default=bytes),
+        ),
+        migrations.AddField(
+            model_name='userquiz',
+            name='answers_packed',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
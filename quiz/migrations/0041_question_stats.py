@@ -0,0 +1,59 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0040_userquiz_answer_log'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OptionStats',
+            fields=[
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('option', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='quiz.questionoptions')),
+                ('picks', models.PositiveIntegerField(default=0)),
+                ('pick_rate', models.FloatField(null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Option stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='QuestionStats',
+            fields=[
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='quiz.question')),
+                ('served', models.PositiveIntegerField(default=0)),
+                ('answered', models.PositiveIntegerField(default=0)),
+                ('correct', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.BigIntegerField(default=0)),
+                ('score_squares', models.BigIntegerField(default=0)),
+                ('correct_score_sum', models.BigIntegerField(default=0)),
+                ('time_sum', models.FloatField(default=0)),
+                ('difficulty', models.FloatField(null=True)),
+                ('discrimination', models.FloatField(null=True)),
+                ('avg_time', models.FloatField(null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Question stats',
+            },
+        ),
+        migrations.AddField(
+            model_name='userquiz',
+            name='items_analyzed',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='userquiz',
+            index=models.Index(condition=models.Q(('is_completed', True), ('items_analyzed', False)), fields=['id'], name='userquiz_pending_items_idx'),
+        ),
+    ]
@@ -1,8 +1,15 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q, Sum
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
+from django.conf import settings
 from django.utils import timezone
+from array import array
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import NamedTuple
 import logging
+import random
+import sys
 
 logger = logging.getLogger(__name__)
 
@@ -17,7 +24,6 @@ class Level(TimeStampedModel):
     name = models.CharField(max_length=70, unique=True)
     slug = models.SlugField(unique=True)
     description = models.TextField()
-    users = models.ManyToManyField(get_user_model())  # Users who have access to this level
 
     def __str__(self):
         return self.name
@@ -26,7 +32,6 @@ class Quiz(TimeStampedModel):
     title = models.CharField(max_length=70)
     slug = models.SlugField(unique=True)
     description = models.TextField()
-    users = models.ManyToManyField(get_user_model(),)
     published = models.BooleanField(default=False)
     published_at = models.DateTimeField(
         blank=True, null=True, editable=False
@@ -36,6 +41,7 @@ class Quiz(TimeStampedModel):
         validators=[MinValueValidator(timezone.now)],
     )
     level = models.ForeignKey(Level, on_delete=models.CASCADE, default = 1)  
+    question_count = models.PositiveIntegerField(default=0, editable=False)
 
 
     def __str__(self):
@@ -46,11 +52,55 @@ class Quiz(TimeStampedModel):
         return self.end_date < timezone.now()
 
     def total_questions(self):
-        return self.question_set.all().count()
+        return self.question_count
 
     class Meta:
         verbose_name = 'Quiz'
         verbose_name_plural = 'Quizzes'
+        indexes = [
+            # QuizMixin.get_queryset and catalog_quizzes: open published quizzes
+            # ordered by end_date, once a user's access set is most of the table
+            models.Index(
+                fields=['end_date'], condition=Q(published=True),
+                name='quiz_open_end_date_idx',
+            ),
+            # LevelQuizView: published quizzes of a level
+            models.Index(fields=['level', 'published'], name='quiz_level_published_idx'),
+        ]
+
+class Cohort(TimeStampedModel):
+    # A group of users granted access to quizzes, directly or to every quiz of a level
+    name = models.CharField(max_length=100, unique=True)
+    slug = models.SlugField(unique=True)
+    description = models.TextField(blank=True)
+    members = models.ManyToManyField(
+        get_user_model(), through='CohortMembership', related_name='cohorts'
+    )
+    quizzes = models.ManyToManyField(Quiz, blank=True, related_name='cohorts')
+    levels = models.ManyToManyField(Level, blank=True, related_name='cohorts')
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def member_count(self):
+        return self.cohortmembership_set.count()
+
+class CohortMembership(TimeStampedModel):
+    cohort = models.ForeignKey(Cohort, on_delete=models.CASCADE)
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
+
+    def __str__(self):
+        return f"{self.user} in {self.cohort}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cohort', 'user'], name='cohort_membership_unique'),
+        ]
+        indexes = [
+            # Access checks start from the user's memberships
+            models.Index(fields=['user', 'cohort'], name='cohort_membership_user_idx'),
+        ]
 
 class Question(TimeStampedModel):
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
@@ -68,6 +118,90 @@ class QuestionOptions(models.Model):
     def __str__(self):
         return self.option
 
+class QuestionStats(TimeStampedModel):
+    """Item analysis of a question over completed attempts, see quiz.analytics."""
+    question = models.OneToOneField(
+        Question, on_delete=models.CASCADE, primary_key=True, related_name='stats'
+    )
+    served = models.PositiveIntegerField(default=0)
+    answered = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+    # Running sums over the attempts that were served the question, so new
+    # attempts are folded in without reading the old ones again
+    score_sum = models.BigIntegerField(default=0)
+    score_squares = models.BigIntegerField(default=0)
+    correct_score_sum = models.BigIntegerField(default=0)
+    time_sum = models.FloatField(default=0)  # Seconds, answered only
+    difficulty = models.FloatField(null=True)  # Share answered correctly
+    discrimination = models.FloatField(null=True)  # Point-biserial against the attempt's score
+    avg_time = models.FloatField(null=True)
+
+    class Meta:
+        verbose_name_plural = 'Question stats'
+
+    def __str__(self):
+        return f'{self.question} stats'
+
+class OptionStats(TimeStampedModel):
+    option = models.OneToOneField(
+        QuestionOptions, on_delete=models.CASCADE, primary_key=True, related_name='stats'
+    )
+    picks = models.PositiveIntegerField(default=0)
+    pick_rate = models.FloatField(null=True)  # Of the times its question was served
+
+    class Meta:
+        verbose_name_plural = 'Option stats'
+
+    def __str__(self):
+        return f'{self.option} stats'
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+ANSWER_RECORD_WIDTH = 5
+
+
+class AnswerRecord(NamedTuple):
+    question_id: int
+    option_id: int  # None when the question went unanswered
+    is_correct: bool
+    served_at: datetime
+    answered_at: datetime
+
+
+def _micros(value):
+    return (value - EPOCH) // timedelta(microseconds=1) if value else 0
+
+
+def _little_endian(values):
+    # Packed answers are stored little-endian, whatever the host's byte order
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def pack_answers(records):
+    """Flatten answer records into little-endian int64s: question, option,
+    correct, served and answered (µs)."""
+    return _little_endian(array('q', [
+        value for record in records for value in (
+            record.question_id, record.option_id or 0, int(bool(record.is_correct)),
+            _micros(record.served_at), _micros(record.answered_at),
+        )
+    ])).tobytes()
+
+
+def unpack_answers(packed):
+    values = _little_endian(array('q', bytes(packed)))
+    return [
+        AnswerRecord(
+            question_id, option_id or None, bool(is_correct),
+            EPOCH + timedelta(microseconds=served_at),
+            EPOCH + timedelta(microseconds=answered_at) if answered_at else None,
+        )
+        for question_id, option_id, is_correct, served_at, answered_at in zip(
+            *[iter(values)] * ANSWER_RECORD_WIDTH
+        )
+    ]
+
 class UserQuiz(TimeStampedModel):
     user = models.ForeignKey(
         get_user_model(),
@@ -84,17 +218,35 @@ class UserQuiz(TimeStampedModel):
     end_time = models.DateTimeField(null=True, blank=True)    # When the quiz ends
     full_time = models.IntegerField(default=0)  # Total time allowed for the quiz
     calculated_score = models.IntegerField(default=0)
+    answered_count = models.PositiveIntegerField(default=0)  # Questions served in this attempt
+    correct_count = models.PositiveIntegerField(default=0)
+    # Question ids in serving order, packed as int64; answered_count is the cursor
+    question_order = models.BinaryField(default=bytes, editable=False)
+    # Completed attempts move their answer rows here, see tasks.compact_attempt
+    answer_log = models.BinaryField(default=bytes, editable=False)
+    answers_packed = models.BooleanField(default=False, editable=False)
+    items_analyzed = models.BooleanField(default=False, editable=False)
 
     class Meta:
         verbose_name = 'User Quiz'
         verbose_name_plural = 'User Quizzes'
         unique_together = ('user', 'quiz')
+        indexes = [
+            # apply_pending_scores only ever looks at this handful of rows
+            models.Index(
+                fields=['id'], condition=Q(is_completed=True, is_score_added_total=False),
+                name='userquiz_pending_score_idx',
+            ),
+            # analyze_items picks up only the attempts completed since its last run
+            models.Index(
+                fields=['id'], condition=Q(is_completed=True, items_analyzed=False),
+                name='userquiz_pending_items_idx',
+            ),
+        ]
 
     @property
     def score(self):
-        return UserQuestionAnswer.objects.filter(
-            user_quiz=self, answer__answer=True
-        ).count()
+        return self.correct_count
 
     # @property
     # def total_score(self):
@@ -102,29 +254,98 @@ class UserQuiz(TimeStampedModel):
     
     @property
     def total_questions(self):
-        return self.quiz.question_set.all().count()     
+        return self.quiz.question_count
+
+    @property
+    def question_ids(self):
+        return array('q', bytes(self.question_order)).tolist()
+
+    def draw_question_order(self, question_ids, served_ids=()):
+        question_ids = [
+            question_id for question_id in question_ids if question_id not in served_ids
+        ]
+        random.shuffle(question_ids)
+        self.question_order = array('q', [*served_ids, *question_ids]).tobytes()
+
+    def next_question_id(self, available_ids):
+        order = self.question_ids
+        for question_id in order[self.answered_count:]:
+            if question_id in available_ids:
+                return question_id
+        return None
+
+    def record_served(self, question):
+        # The cursor is claimed first, so of two overlapping requests that read
+        # the same cursor only one serves; the other gets None
+        with transaction.atomic():
+            claimed = UserQuiz.objects.filter(
+                pk=self.pk, answered_count=self.answered_count
+            ).update(answered_count=F('answered_count') + 1)
+            if not claimed:
+                return None
+            user_answer = UserQuestionAnswer.objects.create(
+                user_quiz=self, question_id=question.pk,
+            )
+        self.answered_count += 1
+        return user_answer
 
-    def completed(self, user, quiz):
-        user_quiz_answers = UserQuestionAnswer.objects.filter(
-            user_quiz__user=user,
-            user_quiz__quiz=quiz  
+    def record_answer(self, question, option):
+        # Only the first answer to a served question counts towards the score,
+        # and only while its clock is running; the server's clock, not the page's
+        now = timezone.now()
+        grace = getattr(settings, 'QUIZ_ANSWER_GRACE_SECONDS', 0)
+        with transaction.atomic():
+            answered = UserQuestionAnswer.objects.filter(
+                user_quiz=self, question_id=question.pk, answer__isnull=True,
+                served_at__gte=now - timedelta(seconds=question.time + grace),
+            ).update(answer_id=option.pk, answered_at=now, modified=now)
+            if answered and option.answer:
+                UserQuiz.objects.filter(pk=self.pk).update(
+                    correct_count=F('correct_count') + 1
+                )
+                self.correct_count += 1
+        return bool(answered)
+
+    def answer_records(self):
+        """The attempt's answers in serving order, packed or still in answer rows."""
+        if self.answers_packed:
+            return unpack_answers(self.answer_log)
+        rows = self.userquestionanswer_set.order_by('id').values_list(
+            'question_id', 'answer_id', 'answer__answer', 'served_at', 'answered_at'
+        )
+        return [
+            AnswerRecord(question_id, option_id, bool(is_correct), served_at, answered_at)
+            for question_id, option_id, is_correct, served_at, answered_at in rows
+        ]
+
+    def timing_ledger(self):
+        return self.userquestionanswer_set.values_list(
+            'question__time', 'served_at', 'answered_at', 'answer__answer'
         )
-        total_questions = quiz.total_questions()
-        if user_quiz_answers.count() == total_questions:
-            if(not self.is_completed):
-                self.end_time = timezone.now() 
-                start_time = self.start_time
-                end_time = self.end_time
-                full_time = self.full_time
-                play_time = (end_time - start_time).total_seconds() - self.total_questions*2
-                logger.debug(f"Start time: {start_time}, End time: {end_time}, Full time: {full_time}, Play time: {play_time}, Queues time: {self.total_questions*2}, Ratio: {(full_time - play_time)/full_time}")
-                self.calculated_score = 100*self.score*((full_time - play_time)/full_time)
-            self.is_completed = True
-            self.save()
-            return True
-        
-        else:
-            return False  # Quiz is not yet completed
+
+    @staticmethod
+    def score_ledger(ledger, full_time):
+        """Score an attempt from its (time, served_at, answered_at, correct) rows in one pass.
+
+        Each question costs the seconds taken to answer it, or its whole time
+        when it went unanswered; the score is 100 points per correct answer,
+        scaled by the share of the quiz's time left over.
+        """
+        correct, play_time = 0, 0.0
+        for time_limit, served_at, answered_at, is_correct in ledger:
+            if answered_at is None:
+                play_time += time_limit
+            else:
+                play_time += min(max((answered_at - served_at).total_seconds(), 0), time_limit)
+            correct += bool(is_correct)
+        if not full_time:
+            return 0, play_time
+        return 100 * correct * (full_time - play_time) / full_time, play_time
+
+    @property
+    def is_finished(self):
+        # Every question served; services.complete_attempt then records the transition
+        return self.is_completed or self.answered_count >= self.quiz.question_count
 
 class UserQuestionAnswer(TimeStampedModel):
     user_quiz = models.ForeignKey(
@@ -136,9 +357,16 @@ class UserQuestionAnswer(TimeStampedModel):
     answer = models.ForeignKey(
         QuestionOptions, on_delete=models.SET_NULL, null=True
     )
+    # Timing ledger: the answer counts only within the question's time of served_at
+    served_at = models.DateTimeField(default=timezone.now)
+    answered_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         unique_together = ('user_quiz', 'question', 'answer')
+        indexes = [
+            # Correct answers of an attempt, joined to the chosen option
+            models.Index(fields=['user_quiz', 'answer'], name='uqa_user_quiz_answer_idx'),
+        ]
 
 class Reward(TimeStampedModel):
     name = models.CharField(max_length=100)
@@ -162,10 +390,8 @@ class UserScore(TimeStampedModel):
     total_score = models.IntegerField(default=0)
 
     def calculate_total_quiz_score(self):
-        user_quizzes = UserQuiz.objects.filter(user=self.user)
-        total_score = sum(quiz.calculated_score for quiz in user_quizzes)
-        
-        return total_score
+        return UserQuiz.objects.filter(user=self.user).aggregate(
+            total=Sum('calculated_score'))['total'] or 0
 
     def update_total_score(self):
         self.total_score = self.calculate_total_quiz_score()
@@ -173,4 +399,28 @@ class UserScore(TimeStampedModel):
 
     def __str__(self):
         return f'{self.user.username} - {self.total_score} score'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-total_score', 'id'], name='userscore_rank_idx'),
+        ]
+
+class ScoreRollup(TimeStampedModel):
+    """Points a user earned on one board: a scope and a time window, see quiz.leaderboard."""
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
+    scope = models.CharField(max_length=32)  # 'all', 'level:<id>' or 'quiz:<id>'
+    window = models.CharField(max_length=16)  # 'all', 'day:<date>' or 'week:<ISO week>'
+    score = models.IntegerField(default=0)
+    attempts = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.user_id} - {self.scope} {self.window} - {self.score} score'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'window', 'user'], name='scorerollup_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['scope', 'window', '-score', 'id'], name='scorerollup_rank_idx'),
+        ]
     
\ No newline at end of file
@@ -0,0 +1,155 @@
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+from quiz import leaderboard, tasks
+from quiz.cache import get_bundle
+from quiz.models import Reward, UserQuestionAnswer, UserQuiz, UserReward, UserScore
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def start_attempt(user, quiz):
+    """Create the user's attempt with its timing and question order in one INSERT."""
+    bundle = get_bundle(quiz)
+    user_quiz = UserQuiz(
+        user=user, quiz=quiz,
+        start_time=timezone.now(),
+        full_time=bundle.total_time,
+    )
+    user_quiz.draw_question_order(bundle.questions)
+    try:
+        with transaction.atomic():
+            user_quiz.save(force_insert=True)
+    except IntegrityError:
+        # A double-submitted start form, the first request already created it
+        logger.debug(f"User {user.username} already started quiz {quiz.slug}")
+        user_quiz = UserQuiz.objects.get(user=user, quiz=quiz)
+    return user_quiz
+
+
+def complete_attempt(user_quiz):
+    """Mark a finished attempt completed and scored, exactly once.
+
+    Already completed attempts cost nothing. Otherwise a single conditional
+    UPDATE claims the transition, so concurrent requests can't score or total
+    the same attempt twice, and the ledger is scored under that claim.
+    """
+    if user_quiz.is_completed:
+        return False
+    end_time = timezone.now()
+    with transaction.atomic():
+        completed = UserQuiz.objects.filter(pk=user_quiz.pk, is_completed=False).update(
+            is_completed=True, end_time=end_time, modified=end_time,
+        )
+        if completed:
+            # Read after claiming, so the score covers every answer recorded before it
+            score, play_time = UserQuiz.score_ledger(user_quiz.timing_ledger(), user_quiz.full_time)
+            UserQuiz.objects.filter(pk=user_quiz.pk).update(calculated_score=score)
+            # queryset.update() skips the post_save handler that would do this
+            tasks.enqueue(tasks.apply_quiz_score, user_quiz.pk)
+            tasks.enqueue(tasks.compact_attempt, user_quiz.pk)
+    user_quiz.is_completed = True
+    if completed:
+        user_quiz.end_time, user_quiz.calculated_score = end_time, int(score)
+        logger.debug(f"Completed user quiz {user_quiz.pk}: play time {play_time}s, score {int(score)}")
+    return bool(completed)
+
+
+def next_question(user_quiz, bundle):
+    """The next question to serve from the bundle, or None when there are no more."""
+    questions = bundle.questions
+    question_id = user_quiz.next_question_id(questions)
+    if question_id is None and user_quiz.answered_count < len(questions):
+        # Attempts started before the order was stored, or questions added since
+        served_ids = list(
+            user_quiz.userquestionanswer_set.values_list('question_id', flat=True)
+        )
+        user_quiz.draw_question_order(questions, served_ids)
+        user_quiz.save(update_fields=['question_order'])
+        question_id = user_quiz.next_question_id(questions)
+    return questions.get(question_id)
+
+
+def serve_question(user_quiz, bundle):
+    """Serve the attempt's next question, returning it with its served_at, or
+    (None, None) when there are no more.
+
+    A request that loses the cursor to an overlapping one (a double refresh, a
+    second tab, a retried answer) serves what that one served instead of a copy.
+    """
+    while True:
+        question = next_question(user_quiz, bundle)
+        if question is None:
+            return None, None
+        user_answer = user_quiz.record_served(question)
+        if user_answer is not None:
+            return question, user_answer.served_at
+        user_quiz.refresh_from_db(fields=['answered_count', 'question_order'])
+        question, served_at = pending_question(user_quiz, bundle)
+        if question is not None:
+            return question, served_at
+
+
+def answer_deadline(question, served_at):
+    return served_at + timedelta(seconds=question.time + getattr(settings, 'QUIZ_ANSWER_GRACE_SECONDS', 0))
+
+
+def pending_question(user_quiz, bundle):
+    """The last served question and its deadline, if it is still open for an answer."""
+    last = UserQuestionAnswer.objects.filter(user_quiz=user_quiz).order_by('-id').values_list(
+        'question_id', 'answer_id', 'served_at').first()
+    if not last or last[1] is not None:
+        return None, None
+    question = bundle.questions.get(last[0])
+    if question and answer_deadline(question, last[2]) > timezone.now():
+        return question, last[2]
+    return None, None
+
+
+class RedemptionError(Exception):
+    pass
+
+
+def redeem_reward(user, reward):
+    """Spend the user's points on one unit of the reward, or raise RedemptionError."""
+    with transaction.atomic():
+        # Both updates are conditional, so concurrent redemptions can't oversell
+        # stock or spend the same points twice; either failure rolls back the other
+        taken = Reward.objects.filter(
+            pk=reward.pk, quantity__gt=0, exchanged_points=reward.exchanged_points
+        ).update(quantity=F('quantity') - 1)
+        if not taken:
+            raise RedemptionError(f"{reward.name} is no longer available")
+
+        spent = UserScore.objects.filter(
+            user=user, total_score__gte=reward.exchanged_points
+        ).update(total_score=F('total_score') - reward.exchanged_points)
+        if not spent:
+            raise RedemptionError(f"Not enough points to redeem {reward.name}")
+
+        user_reward = UserReward.objects.create(user=user, reward=reward)
+
+    user_score = UserScore.objects.select_related('user').get(user=user)
+    leaderboard.score_changed(user_score, previous_score=user_score.total_score + reward.exchanged_points)
+    return user_reward
+
+
+def backfill_user_scores(batch_size=5000):
+    """Create the missing UserScore rows with one anti-join and batched inserts."""
+    missing = get_user_model().objects.filter(
+        ~Exists(UserScore.objects.filter(user=OuterRef('pk')))
+    ).values_list('id', flat=True)
+    user_ids = list(missing)
+    for start in range(0, len(user_ids), batch_size):
+        # A signup racing the backfill already has its row, ignore_conflicts skips it
+        UserScore.objects.bulk_create(
+            [UserScore(user_id=user_id) for user_id in user_ids[start:start + batch_size]],
+            ignore_conflicts=True,
+        )
+    if user_ids:
+        logger.info(f"Created {len(user_ids)} missing user scores")
+    return len(user_ids)
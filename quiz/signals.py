@@ -1,10 +1,16 @@
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from .models import UserScore, UserQuiz
+from .models import (
+    Cohort, CohortMembership, Level, UserScore, UserQuiz, Quiz, Question, QuestionOptions,
+)
+from . import tasks
+from .cache import get_bundle, invalidate_catalog, invalidate_levels, invalidate_quiz
+from .entitlements import invalidate_grants, invalidate_members
 from django.utils import timezone
 import logging
-from django.db.models import Sum
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
 logger = logging.getLogger(__name__)
 
@@ -15,26 +21,73 @@ def create_user_score(sender, instance, created, **kwargs):
     if created:
         UserScore.objects.get_or_create(user=instance)
 
-@receiver(post_save, sender=UserQuiz)
-def set_start_time_and_full_time(sender, instance, created, **kwargs):
-    if created:  # When a new UserQuiz is created
-        instance.start_time = timezone.now()  
-        instance.full_time = instance.quiz.question_set.aggregate(
-            total_time=Sum('time'))['total_time'] or 0
-        instance.save()
+@receiver(pre_save, sender=UserQuiz)
+def set_start_time_and_full_time(sender, instance, **kwargs):
+    # services.start_attempt fills these in already; this covers attempts created elsewhere
+    if instance._state.adding and instance.start_time is None:
+        instance.start_time = timezone.now()
+        instance.full_time = get_bundle(instance.quiz).total_time
 
 
 @receiver(post_save, sender=UserQuiz)
-def update_user_score_after_quiz(sender, instance, created, **kwargs):
-    user_score, created = UserScore.objects.get_or_create(user=instance.user)
+def update_user_score_after_quiz(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'is_completed' not in update_fields:
+        return  # Saves that can't change completion state
     if instance.is_completed and not instance.is_score_added_total:  # Check if the quiz is completed
-        user_score.update_total_score()
-        instance.is_score_added_total = True
+        # The total is bumped by this attempt's score off the request path
+        tasks.enqueue(tasks.apply_quiz_score, instance.pk)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def update_quiz_question_count(sender, instance, **kwargs):
+    question_count = Question.objects.filter(quiz=OuterRef('pk')).values(
+        'quiz').annotate(total=Count('id')).values('total')
+    Quiz.objects.filter(id=instance.quiz_id).update(
+        question_count=Coalesce(Subquery(question_count), 0))
+    invalidate_quiz(instance.quiz_id)
+
+
+@receiver(post_save, sender=QuestionOptions)
+@receiver(post_delete, sender=QuestionOptions)
+def invalidate_quiz_options(sender, instance, **kwargs):
+    quiz_id = Question.objects.filter(
+        id=instance.question_id).values_list('quiz_id', flat=True).first()
+    if quiz_id:
+        invalidate_quiz(quiz_id)
+
+
+@receiver(post_delete, sender=Quiz)
+def invalidate_deleted_quiz(sender, instance, **kwargs):
+    level_slug = Level.objects.filter(id=instance.level_id).values_list('slug', flat=True).first()
+    invalidate_catalog(*filter(None, [level_slug]))
+
+
+@receiver(pre_save, sender=Level)
+def remember_level_slug(sender, instance, **kwargs):
+    instance._old_slug = Level.objects.filter(pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Level)
+@receiver(post_delete, sender=Level)
+def invalidate_level(sender, instance, **kwargs):
+    invalidate_levels(*filter(None, [instance.slug, getattr(instance, '_old_slug', None)]))
 
-        instance.save()
-        
 
+@receiver(post_save, sender=CohortMembership)
+@receiver(post_delete, sender=CohortMembership)
+def invalidate_membership(sender, instance, **kwargs):
+    # Bulk enrollment goes through quiz.entitlements, which invalidates itself
+    invalidate_members(instance.user_id)
 
 
+@receiver(m2m_changed, sender=Cohort.quizzes.through)
+@receiver(m2m_changed, sender=Cohort.levels.through)
+def invalidate_cohort_grants(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_grants()
 
 
+@receiver(post_delete, sender=Cohort)
+def invalidate_deleted_cohort(sender, instance, **kwargs):
+    invalidate_grants()
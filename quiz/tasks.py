@@ -0,0 +1,97 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from quiz import leaderboard
+from quiz.models import UserQuestionAnswer, UserQuiz, UserScore, pack_answers
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'QUIZ_TASK_WORKERS', 1),
+                thread_name_prefix='quiz-tasks',
+            )
+    return _executor
+
+
+def drain():
+    """Wait for queued tasks to finish; the next enqueue starts a fresh pool."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def _run(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception(f"Background task {func.__name__}{args} failed")
+    finally:
+        # Worker threads hold their own connection, don't leak it between tasks
+        connection.close()
+
+
+def enqueue(func, *args):
+    """Run func(*args) off the request path once the current transaction commits."""
+    if not getattr(settings, 'QUIZ_TASKS_ASYNC', True):
+        transaction.on_commit(lambda: func(*args))
+        return
+    transaction.on_commit(lambda: get_executor().submit(_run, func, *args))
+
+
+def apply_quiz_score(user_quiz_id):
+    with transaction.atomic():
+        # Claiming the flag makes re-delivered or duplicate tasks no-ops. It is
+        # the first statement so SQLite takes the write lock before any read
+        claimed = UserQuiz.objects.filter(
+            pk=user_quiz_id, is_completed=True, is_score_added_total=False
+        ).update(is_score_added_total=True)
+        if not claimed:
+            return
+        user_quiz = UserQuiz.objects.filter(pk=user_quiz_id).values(
+            'user_id', 'calculated_score', 'quiz_id', 'quiz__level_id', 'end_time', 'modified').get()
+
+        user_id, delta = user_quiz['user_id'], user_quiz['calculated_score']
+        updated = UserScore.objects.filter(user_id=user_id).update(
+            total_score=F('total_score') + delta
+        )
+        if not updated:
+            UserScore.objects.create(user_id=user_id, total_score=delta)
+        # Under the same claim, so the scoped and windowed boards agree with the total
+        leaderboard.add_to_rollups(
+            user_id, user_quiz['quiz_id'], user_quiz['quiz__level_id'],
+            user_quiz['end_time'] or user_quiz['modified'], delta,
+        )
+
+    user_score = UserScore.objects.select_related('user').get(user_id=user_id)
+    leaderboard.score_changed(user_score, previous_score=user_score.total_score - delta)
+    logger.debug(f"Added {delta} points from user quiz {user_quiz_id} to {user_score}")
+
+
+def compact_attempt(user_quiz_id):
+    """Fold a completed attempt's answer rows into UserQuiz.answer_log."""
+    with transaction.atomic():
+        # Claimed first, like apply_quiz_score, so SQLite takes the write lock up front
+        claimed = UserQuiz.objects.filter(
+            pk=user_quiz_id, is_completed=True, answers_packed=False
+        ).update(answers_packed=True)
+        if not claimed:
+            return False
+        user_quiz = UserQuiz(pk=user_quiz_id)
+        records = user_quiz.answer_records()
+        UserQuiz.objects.filter(pk=user_quiz_id).update(answer_log=pack_answers(records))
+        UserQuestionAnswer.objects.filter(user_quiz_id=user_quiz_id).delete()
+    logger.debug(f"Packed {len(records)} answers of user quiz {user_quiz_id}")
+    return True
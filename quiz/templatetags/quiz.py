@@ -1,6 +1,4 @@
 from django import template
-from quiz import models
-from quiz.models import UserQuestionAnswer
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,53 +7,36 @@ logger = logging.getLogger(__name__)
 register = template.Library()
 
 
+def get_user_quiz(user, quiz):
+    # Views attach the user's attempts up front (see QuizMixin.attach_user_quizzes)
+    # so rendering a list of quizzes does not query once per quiz
+    attempts = getattr(quiz, 'user_attempts', None)
+    if attempts is not None:
+        return next((attempt for attempt in attempts if attempt.user_id == user.id), None)
+    return quiz.userquiz_set.filter(user=user).first()
+
+
 @register.filter
 def user_quiz(user, quiz):
-    return models.UserQuiz.objects.filter(
-        user=user, quiz=quiz
-    ).exists()
+    return get_user_quiz(user, quiz) is not None
 
 
 @register.filter
-# def user_quiz_completed(user, quiz):
-#     user_quiz = models.UserQuestionAnswer.objects.filter(
-#         user_quiz__user=user
-#     )
-#     return user_quiz.count() == quiz.question_set.all().count()
 def user_quiz_completed(user, quiz):
-    # Get the user quiz for the given user and quiz
-    user_quiz = quiz.userquiz_set.filter(user=user).first()
+    user_quiz = get_user_quiz(user, quiz)
 
     if not user_quiz:
         return False
 
-    # Count how many questions the user has answered
-    answered_questions = UserQuestionAnswer.objects.filter(user_quiz=user_quiz).count()
-
-    # Compare it with the total number of questions in the quiz
-    total_questions = quiz.question_set.count()
-
-    # Return True if all questions are answered
-    return answered_questions == total_questions
-
+    # Same rule as UserQuiz.is_finished, against the quiz already in hand
+    return user_quiz.is_completed or user_quiz.answered_count >= quiz.question_count
 
 
 @register.filter
-# def quiz_user_score(user, quiz):
-#     return models.UserQuestionAnswer.objects.filter(
-#         user_quiz__quiz=quiz, answer__answer=True
-#     ).count()
-
 def quiz_user_score(user, quiz):
-    # Get the user quiz for the given user and quiz
-    user_quiz = quiz.userquiz_set.filter(user=user).first()
+    user_quiz = get_user_quiz(user, quiz)
 
     if not user_quiz:
         return 0
 
-    # Count the number of correct answers
-    correct_answers = UserQuestionAnswer.objects.filter(
-        user_quiz=user_quiz, answer__answer=True
-    ).count()
-
-    return correct_answers
+    return user_quiz.correct_count
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = "quiz"
 
@@ -24,5 +24,10 @@ urlpatterns = [
         name="user_quizzes"
     ),
     path('leaderboard', views.LeaderboardView.as_view(), name="leaderboard"),
+    path('leaderboard/stream/', views.LeaderboardStream.as_view(), name="leaderboard_stream"),
     path('reward', views.RewardView.as_view(), name="reward"),
+    path('api/quiz/<slug:slug>/start/', api.StartAttempt.as_view(), name="api_start"),
+    path('api/quiz/<slug:slug>/question/', api.CurrentQuestion.as_view(), name="api_question"),
+    path('api/quiz/<slug:slug>/answer/', api.SubmitAnswer.as_view(), name="api_answer"),
+    path('api/quiz/<slug:slug>/result/', api.AttemptResult.as_view(), name="api_result"),
 ]
@@ -1,11 +1,16 @@
+from asgiref.sync import sync_to_async
+from django.views import View
 from django.views.generic import TemplateView, DetailView
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404, redirect
 from django.utils.decorators import method_decorator
 from django.utils import timezone
 from django.core import serializers
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 import logging
-from quiz import models
+from quiz import models, leaderboard, live, services
+from quiz.cache import catalog_level, catalog_levels, catalog_quizzes, get_bundle
+from quiz.entitlements import accessible_quiz_ids
 import json
 
 logger = logging.getLogger(__name__)
@@ -14,7 +19,7 @@ logger = logging.getLogger(__name__)
 class QuizMixin:
     def get_queryset(self):
         return models.Quiz.objects.filter(
-            users=self.request.user, published=True,
+            id__in=accessible_quiz_ids(self.request.user), published=True,
             end_date__gte=timezone.now()
         ).order_by('end_date')
 
@@ -25,13 +30,28 @@ class QuizMixin:
 
     def get_user_quizzes(self, queryset=None):
         if not queryset:
-            queryset = models.UserQuiz.objects.filter(user=self.request.user, quiz__published=True)  
+            queryset = models.UserQuiz.objects.filter(
+                user=self.request.user, quiz__published=True
+            ).select_related('quiz', 'user')
         return queryset
 
+    def attach_user_quizzes(self, user_quizzes):
+        # Lets the quiz templatetags read completion state and score without queries
+        for user_quiz in user_quizzes:
+            user_quiz.quiz.user_attempts = [user_quiz]
+        return user_quizzes
+
     def get_user_quiz(self, queryset=None, quiz=None):
         if not queryset:
             queryset = self.get_user_quizzes()
         return get_object_or_404(queryset, quiz=quiz)
+
+    def get_user_quiz_by_slug(self):
+        # The quiz comes along with the attempt, in a single query
+        return models.UserQuiz.objects.select_related('quiz').filter(
+            user=self.request.user, quiz__in=self.get_queryset(),
+            quiz__slug=self.kwargs['slug'],
+        ).first()
     
     def get_all_user_quizzes(self, queryset=None):
         if not queryset:
@@ -63,13 +83,14 @@ class IndexView(TemplateView):
 
 class LevelQuizView(TemplateView):
     template_name = "quiz/level_quizzes.html"
+    use_replica = True  # Pure reads, see core.middleware.ReplicaRoutingMiddleware
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        level = get_object_or_404(models.Level, slug=self.kwargs['slug'])
-        
-        quizzes = models.Quiz.objects.filter(level=level, published=True)  # Add filter for published quizzes
+        level, quizzes = catalog_level(self.kwargs['slug'])  # Published quizzes only
+        if level is None:
+            raise Http404("Level not found")
 
         context['level'] = level
         context['quizzes'] = quizzes
@@ -79,12 +100,14 @@ class LevelQuizView(TemplateView):
 
 class QuizView(QuizMixin, TemplateView):
     template_name = "quiz/quiz.html"
+    use_replica = True
     extra_context = {'title': "Quizzes"}
 
     def get_context_data(self, **kwargs):
         kwargs = super().get_context_data()
-        kwargs['quiz_list'] = self.get_queryset()
-        kwargs['levels'] = models.Level.objects.all()
+        # Shared by every user with the same access, see quiz.cache
+        kwargs['quiz_list'] = catalog_quizzes(accessible_quiz_ids(self.request.user))
+        kwargs['levels'] = catalog_levels()
 
         return kwargs
 
@@ -108,97 +131,89 @@ class QuizDetail(QuizMixin, DetailView):
         return super().dispatch(request, *args, **kwargs)
 
     def post(self, request, *args, **kwargs):
-        models.UserQuiz.objects.create(user=request.user, quiz=self.quiz)
+        services.start_attempt(request.user, self.quiz)
         return redirect('quiz:quiz_question', self.kwargs['slug'])
 
 class QuestionAnswer(QuizMixin, TemplateView):
     template_name = "quiz/quiz_question.html"
     extra_context = {}
     def get_question(self):
-        self.user_question_ans_ids = self.user_quiz.userquestionanswer_set.values_list('question__id', flat=True)
-        question = self.quiz.question_set.exclude(id__in=self.user_question_ans_ids).order_by('?').first()
+        question, _ = services.serve_question(self.user_quiz, self.bundle)
         return question
 
+    @method_decorator(login_required)
     def dispatch(self, request, *args, **kwargs):
-        self.quiz = self.get_quiz()
-        self.user_quiz = self.get_user_quiz(quiz=self.quiz)
+        self.user_quiz = self.get_user_quiz_by_slug()
 
         if not self.user_quiz:
             return redirect('quiz:quiz_detail', self.kwargs['slug'])
-        self.question = self.get_question()
+        self.quiz = self.user_quiz.quiz
+        self.bundle = get_bundle(self.quiz)
         return super().dispatch(request, *args, **kwargs)
 
     def get(self, request, *args, **kwargs):
-        if self.user_quiz.completed(request.user, self.quiz):
+        if self.user_quiz.is_finished:
+            services.complete_attempt(self.user_quiz)
             return redirect('quiz:quiz_complete', self.kwargs['slug'])
+        self.question = self.get_question()
         if not self.question:
             self.extra_context["message"] = "Question not available now"
-        else:
-            models.UserQuestionAnswer.objects.create(
-                user_quiz=self.user_quiz, question=self.question,
-            )
-
-            question_options = self.question.questionoptions_set.all()  # Fetch all options for this question
-
-            options_data = [{'option_text': option.option, 'is_answer': option.answer} for option in question_options]
-            correct_option = next((opt for opt in options_data if opt['is_answer']), None)
-
-            if correct_option:
-                self.extra_context['correct_option_text'] = correct_option['option_text'] 
 
-            self.extra_context['question_options'] = options_data
-        
         return super().get(request, *args, **kwargs)
 
     def get_context_data(self, **kwargs):
         kwargs = super().get_context_data(**kwargs)
         kwargs['object'] = self.question
         kwargs['title'] = self.question.question
-        kwargs['question_options'] = self.extra_context.get('question_options', []) 
-        kwargs['correct_option_text'] = self.extra_context.get('correct_option_text', '')  
-
         return kwargs
 
     def post(self, request, *args, **kwargs):
         data = request.POST
         selected_answer = data.get('answer', 'no_answer')
-        user_answer = get_object_or_404(
-            models.UserQuestionAnswer,
-            user_quiz=self.user_quiz,
-            question=self.quiz.question_set.get(id=data['question']),
-        )
+        question_id = data.get('question', '')
+        question = self.bundle.questions.get(int(question_id)) if question_id.isdigit() else None
+        if not question:
+            raise Http404("Question not found")
 
         if(not selected_answer == 'no_answer' and not selected_answer == ""):
-            user_answer.answer_id = data['answer']
-            user_answer.save()
-            is_correct  = user_answer.answer.answer
-            self.extra_context['correct_answer'] = is_correct
-            
+            option = next(
+                (option for option in question.options if str(option.pk) == selected_answer),
+                None,
+            )
+            if not option:
+                raise Http404("Option not found")
+            self.user_quiz.record_answer(question, option)
+
         return self.get(request, *args, **kwargs)
 
 class QuizCompleteView(QuizMixin, TemplateView):
     template_name = "quiz/quiz_complete.html"
     extra_context = {'title': "Quiz Complete"}
 
+    @method_decorator(login_required)
     def dispatch(self, request, *args, **kwargs):
-        self.quiz = self.get_quiz()
-        self.user_quiz = self.get_user_quiz(quiz=self.quiz)
-        if not self.user_quiz.completed(request.user, self.quiz):
+        self.user_quiz = self.get_user_quiz_by_slug()
+        if not self.user_quiz:
+            raise Http404("Quiz not started")
+        if not self.user_quiz.is_finished:
             return redirect('quiz:quiz_question', self.kwargs['slug'])
+        services.complete_attempt(self.user_quiz)  # No-op once completed
+        self.quiz = self.user_quiz.quiz
         return super().dispatch(request, *args, **kwargs)
 
     def get_context_data(self, **kwargs):
         kwargs = super().get_context_data(**kwargs)
-        kwargs['object'] = self.get_user_quiz(quiz=self.quiz)
+        kwargs['object'] = self.user_quiz
         return kwargs
 
 class UserQuizList(QuizMixin, TemplateView):
     template_name = "quiz/user_quiz.html"
+    use_replica = True
     extra_context = {'title': "User Quizzes"}
 
     def get_context_data(self, **kwargs):
         kwargs = super().get_context_data(**kwargs)
-        kwargs['quiz_list'] = self.get_user_quizzes()
+        kwargs['quiz_list'] = self.attach_user_quizzes(self.get_user_quizzes())
         quiz_data = [{
             'user': user_quiz.user.username,
             'user_id': user_quiz.user.id,
@@ -215,26 +230,125 @@ class UserQuizList(QuizMixin, TemplateView):
 
 class LeaderboardView(QuizMixin, TemplateView):
     template_name = "quiz/leaderboard.html"
+    use_replica = True
     extra_context = {'title': "Leaderboard"}
 
+    def get_board(self):
+        """The board's scope and what it ranks, from ?level=<slug> or ?quiz=<slug>."""
+        if self.request.GET.get('quiz'):
+            quiz = get_object_or_404(
+                models.Quiz.objects.filter(id__in=accessible_quiz_ids(self.request.user)),
+                slug=self.request.GET['quiz'],
+            )
+            return leaderboard.quiz_scope(quiz.pk), quiz
+        if self.request.GET.get('level'):
+            level = get_object_or_404(models.Level, slug=self.request.GET['level'])
+            return leaderboard.level_scope(level.pk), level
+        return leaderboard.ALL, None
+
     def get_context_data(self, **kwargs):
         kwargs = super().get_context_data(**kwargs)
-        kwargs['quiz_list_total'] = self.get_all_user_quizzes()
-        kwargs['quiz_scores'] = self.get_all_user_scores()
-        logger.debug(kwargs['quiz_scores'])
-        user_scores = []
-        for user_quiz in kwargs['quiz_scores']:
-            tempDict = {
-                "id": user_quiz.user.id,
-                "user": user_quiz.user.username,
-                "score": user_quiz.total_score
-            }
-            user_scores.append(tempDict)
-        user_scores = sorted(user_scores, key=lambda x: x['score'], reverse=True)
+        scope, board = self.get_board()
+        period = self.request.GET.get('period')
+        if period not in leaderboard.PERIODS:
+            period = leaderboard.ALL
+        number = self.request.GET.get('page')
+
+        if scope == leaderboard.ALL and period == leaderboard.ALL:
+            page_obj, user_scores = leaderboard.page(number)
+            user_score = models.UserScore.objects.filter(user=self.request.user).first()
+            kwargs['user_points'] = user_score.total_score if user_score else 0
+            kwargs['user_rank'] = leaderboard.rank_for(user_score)
+        else:
+            # Contest boards count the points earned, redeemed ones included
+            window = leaderboard.current_window(period)
+            page_obj, user_scores = leaderboard.board_page(scope, window, number)
+            rollup = models.ScoreRollup.objects.filter(
+                user=self.request.user, scope=scope, window=window).first()
+            kwargs['user_points'] = rollup.score if rollup else 0
+            kwargs['user_rank'] = leaderboard.rollup_rank_for(rollup)
+
+        scope_query = self.request.GET.copy()
+        for param in ('page', 'period'):
+            scope_query.pop(param, None)
+        kwargs['board'] = board
+        kwargs['period'] = period
+        kwargs['live'] = live.available(self.request) and not board and period == leaderboard.ALL
+        kwargs['periods'] = leaderboard.PERIODS
+        kwargs['scope_query'] = scope_query.urlencode()
+        kwargs['page_obj'] = page_obj
         kwargs["user_scores"] = user_scores
         logger.debug(user_scores)
         return kwargs
 
+class LeaderboardStream(View):
+    """Pushes the all-time top list and the viewer's rank as Server-Sent Events.
+
+    Streams stay open, so serve this under ASGI (core.asgi): an idle stream
+    is a parked coroutine, woken by leaderboard.score_changed via quiz.live.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        if not live.available(request):
+            # EventSource stops reconnecting on a 204
+            return HttpResponse(status=204)
+        user = await request.auser()
+        if not user.is_authenticated:
+            return HttpResponse(status=401)
+        response = StreamingHttpResponse(self.events(user.pk), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Or nginx holds the events back
+        return response
+
+    @staticmethod
+    def snapshot(user_id):
+        return leaderboard.top(), leaderboard.standing(user_id)
+
+    async def events(self, user_id):
+        # Subscribed before the snapshot is read, so no change falls in between
+        subscription = live.subscribe()
+        try:
+            top, you = await sync_to_async(self.snapshot)(user_id)
+            yield live.sse('snapshot', {'top': top, 'you': you})
+            while True:
+                try:
+                    event = await subscription.get(live.keepalive_seconds())
+                except TimeoutError:
+                    yield live.keepalive()
+                    continue
+                if subscription.resync():
+                    top, you = await sync_to_async(self.snapshot)(user_id)
+                    yield live.sse('snapshot', {'top': top, 'you': you})
+                    continue
+
+                if event['user_id'] == user_id or (you and event['previous_score'] is None):
+                    you, moved = await sync_to_async(leaderboard.standing)(user_id), True
+                else:
+                    moved = self.follow(you, event)
+                if 'top' in event:
+                    yield live.sse('snapshot', {'top': event['top'], 'you': you})
+                elif event['changed'] or event['removed'] or moved:
+                    yield live.sse('delta', {'changed': event['changed'], 'removed': event['removed'], 'you': you})
+        finally:
+            live.unsubscribe(subscription)
+
+    @staticmethod
+    def follow(you, event):
+        """Move the viewer's rank for someone else's change, without a query.
+        True if it moved."""
+        if you is None:
+            return False
+        mine = (-you['score'], you['score_id'])
+        before = (-event['previous_score'], event['score_id'])
+        after = (-event['score'], event['score_id'])
+        if before > mine > after:
+            you['rank'] += 1
+        elif after > mine > before:
+            you['rank'] -= 1
+        else:
+            return False
+        return True
+
 class RewardView(QuizMixin, TemplateView):
     template_name = "quiz/reward.html"
     extra_context = {'title': "Reward"}
@@ -267,7 +381,6 @@ class RewardView(QuizMixin, TemplateView):
 
     def post(self, request, *args, **kwargs):
         reward_id = request.POST.get('reward_id', None)
-        user_score = models.UserScore.objects.get(user=request.user)
 
         if reward_id:
             reward = get_object_or_404(models.Reward, id=reward_id)
@@ -275,23 +388,11 @@ class RewardView(QuizMixin, TemplateView):
             # Logging the user and reward for debugging purposes
             logger.debug(f"User {request.user.username} attempting to redeem reward: {reward.name}")
 
-            # Here you would normally check if the user has enough points, etc.
-            if user_score.total_score >= reward.exchanged_points:
-                logger.debug(f"User {request.user.username} has enough points to redeem {reward.name}.")
-
-                user_score.total_score -= reward.exchanged_points
-                user_score.save()
-                
-                reward.quantity -= 1
-                reward.save()
-
-                # Create a new UserReward entry for the user
-                models.UserReward.objects.create(user=request.user, reward=reward)
-                logger.debug(f"Reward {reward.name} redeemed by user {request.user.username}.")
-
+            try:
+                services.redeem_reward(request.user, reward)
                 logger.debug(f"Reward {reward.name} redeemed by user {request.user.username}.")
-            else:
-                logger.debug(f"User {request.user.username} does not have enough points for {reward.name}.")
+            except services.RedemptionError as e:
+                logger.debug(f"User {request.user.username} could not redeem {reward.name}: {e}")
         else:
             logger.debug("No reward_id detected.")
 